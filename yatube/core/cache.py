@@ -0,0 +1,315 @@
+"""Двухуровневый кеш: локальный LRU процесса перед общим кешем.
+
+Каждый процесс держит небольшой ограниченный LRU со свежими значениями
+общего кеша (файлового, memcached и т.п.), поэтому повторное чтение
+не ходит в общий кеш. Согласованность между процессами держится на
+журнале изменений в общем кеше: set, add, delete, incr и clear
+записывают измененные ключи под очередными номерами, а процессы не
+чаще раза в SYNC_INTERVAL секунд дочитывают журнал и убирают из
+локального уровня только эти ключи. Если журнал прочитать не удалось
+или процесс отстал слишком сильно, локальный уровень сбрасывается
+целиком. Любое значение живет локально не дольше LOCAL_TIMEOUT секунд.
+
+Номер журнала выдает incr общего кеша, поэтому он должен быть
+атомарным. В memcached и redis это так; для файлового кеша есть
+LockingFileBasedCache.
+
+Пример настройки::
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache.TwoTierCache',
+            'OPTIONS': {'SHARED': 'shared'},
+        },
+        'shared': {
+            'BACKEND': 'core.cache.LockingFileBasedCache',
+            'LOCATION': '/var/tmp/yatube-cache',
+        },
+    }
+"""
+import os
+import pickle
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.files import locks
+
+SEQUENCE_KEY = 'two-tier:sequence'
+LOG_KEY = 'two-tier:log:{}'
+# Отставший больше чем на столько записей процесс сбрасывает
+# локальный уровень, не читая журнал.
+LOG_MAX_ENTRIES = 1000
+
+_missing = object()
+
+
+class TwoTierCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = options.get('SHARED', 'shared')
+        self._local_max_entries = int(options.get('LOCAL_MAX_ENTRIES', 1000))
+        self._local_timeout = float(options.get('LOCAL_TIMEOUT', 5))
+        self._sync_interval = float(options.get('SYNC_INTERVAL', 1))
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._sequence = None
+        self._synced_at = 0
+        # Запись журнала нужна, пока жива локальная копия ключа
+        # в каком-нибудь процессе, успевшем синхронизироваться.
+        self._log_timeout = int(
+            self._local_timeout + self._sync_interval) + 1
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    # Локальный уровень.
+
+    def _local_key(self, key, version):
+        return self.shared.make_key(key, version=version)
+
+    def _local_get(self, key):
+        with self._lock:
+            item = self._local.get(key)
+            if item is None:
+                return _missing
+            pickled, expires = item
+            if expires <= time.monotonic():
+                del self._local[key]
+                return _missing
+            self._local.move_to_end(key)
+        return pickle.loads(pickled)
+
+    def _local_set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        lifetime = self._local_timeout
+        backend_timeout = self.get_backend_timeout(timeout)
+        if backend_timeout is not None:
+            lifetime = min(lifetime, backend_timeout - time.time())
+        if lifetime <= 0:
+            self._local_delete(key)
+            return
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        with self._lock:
+            self._local[key] = (pickled, time.monotonic() + lifetime)
+            self._local.move_to_end(key)
+            while len(self._local) > self._local_max_entries:
+                self._local.popitem(last=False)
+
+    def _local_delete(self, key):
+        with self._lock:
+            self._local.pop(key, None)
+
+    def _sync(self):
+        '''Убрать из локального уровня ключи, измененные другими.'''
+        now = time.monotonic()
+        if now - self._synced_at < self._sync_interval:
+            return
+        sequence = self._current_sequence()
+        with self._lock:
+            known = self._sequence
+            self._sequence = sequence
+            self._synced_at = now
+        if sequence == known:
+            return
+        if (known is None or sequence < known
+                or sequence - known > LOG_MAX_ENTRIES):
+            self._local_clear()
+            return
+        log_keys = [LOG_KEY.format(number)
+                    for number in range(known + 1, sequence + 1)]
+        changed = self.shared.get_many(log_keys)
+        if len(changed) < len(log_keys) or None in changed.values():
+            # Запись потеряна или это clear.
+            self._local_clear()
+            return
+        with self._lock:
+            for key in changed.values():
+                self._local.pop(key, None)
+
+    def _current_sequence(self):
+        sequence = self.shared.get(SEQUENCE_KEY)
+        if sequence is None:
+            # Начальный номер не совпадет с прежним после вытеснения.
+            self.shared.add(SEQUENCE_KEY, time.time_ns(), None)
+            sequence = self.shared.get(SEQUENCE_KEY)
+        return sequence
+
+    def _local_clear(self):
+        with self._lock:
+            self._local.clear()
+
+    def _publish(self, local_keys):
+        '''Записать измененные ключи в журнал для других процессов.
+
+        None вместо ключа означает, что сброшено все.
+        '''
+        if not local_keys:
+            return
+        self._sync()
+        try:
+            sequence = self.shared.incr(SEQUENCE_KEY, len(local_keys))
+        except ValueError:
+            self._current_sequence()
+            sequence = self.shared.incr(SEQUENCE_KEY, len(local_keys))
+        first = sequence - len(local_keys) + 1
+        self.shared.set_many({
+            LOG_KEY.format(first + offset): key
+            for offset, key in enumerate(local_keys)
+        }, self._log_timeout)
+        with self._lock:
+            # Если с прошлой сверки никто ничего не менял, свои записи
+            # журнала читать незачем.
+            if self._sequence == first - 1:
+                self._sequence = sequence
+
+    # Интерфейс BaseCache.
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, timeout, version=version)
+        if added:
+            local_key = self._local_key(key, version)
+            self._publish([local_key])
+            self._local_set(local_key, value, timeout)
+        return added
+
+    def get(self, key, default=None, version=None):
+        self._sync()
+        local_key = self._local_key(key, version)
+        value = self._local_get(local_key)
+        if value is not _missing:
+            return value
+        value = self.shared.get(key, _missing, version=version)
+        if value is _missing:
+            return default
+        self._local_set(local_key, value)
+        return value
+
+    def get_many(self, keys, version=None):
+        self._sync()
+        found = {}
+        remote = []
+        for key in keys:
+            value = self._local_get(self._local_key(key, version))
+            if value is _missing:
+                remote.append(key)
+            else:
+                found[key] = value
+        if remote:
+            values = self.shared.get_many(remote, version=version)
+            for key, value in values.items():
+                self._local_set(self._local_key(key, version), value)
+            found.update(values)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self._local_key(key, version)
+        self.shared.set(key, value, timeout, version=version)
+        self._publish([local_key])
+        self._local_set(local_key, value, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version=version)
+        stored = {
+            self._local_key(key, version): value
+            for key, value in data.items() if key not in failed
+        }
+        self._publish(list(stored))
+        for local_key, value in stored.items():
+            self._local_set(local_key, value, timeout)
+        return failed
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self._local_delete(self._local_key(key, version))
+        return self.shared.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        local_key = self._local_key(key, version)
+        self.shared.delete(key, version=version)
+        self._publish([local_key])
+        self._local_delete(local_key)
+
+    def delete_many(self, keys, version=None):
+        local_keys = [self._local_key(key, version) for key in keys]
+        self.shared.delete_many(keys, version=version)
+        self._publish(local_keys)
+        for local_key in local_keys:
+            self._local_delete(local_key)
+
+    def has_key(self, key, version=None):
+        return self.get(key, _missing, version=version) is not _missing
+
+    def incr(self, key, delta=1, version=None):
+        local_key = self._local_key(key, version)
+        value = self.shared.incr(key, delta, version=version)
+        self._publish([local_key])
+        self._local_delete(local_key)
+        return value
+
+    def clear(self):
+        self.shared.clear()
+        self._publish([None])
+        self._local_clear()
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
+
+
+class LockingFileBasedCache(FileBasedCache):
+    '''Файловый кеш с атомарными add и incr.
+
+    FileBasedCache проверяет и записывает значение в два шага, и два
+    процесса могут оба "добавить" ключ или потерять увеличение. Здесь
+    изменения значений идут под блокировкой файла в каталоге кеша.
+    '''
+    lock_name = 'lock'
+
+    @contextmanager
+    def _locked(self):
+        self._createdir()
+        with open(os.path.join(self._dir, self.lock_name), 'ab') as file:
+            locks.lock(file, locks.LOCK_EX)
+            try:
+                yield
+            finally:
+                locks.unlock(file)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._locked():
+            if self.has_key(key, version):
+                return False
+            super().set(key, value, timeout, version)
+            return True
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._locked():
+            super().set(key, value, timeout, version)
+
+    def delete(self, key, version=None):
+        with self._locked():
+            super().delete(key, version)
+
+    def incr(self, key, delta=1, version=None):
+        '''Увеличить значение, сохранив срок его жизни.'''
+        with self._locked():
+            try:
+                with open(self._key_to_file(key, version), 'rb') as file:
+                    expiry = pickle.load(file)
+                    value = pickle.loads(zlib.decompress(file.read()))
+            except FileNotFoundError:
+                value = None
+            now = time.time()
+            if value is None or expiry is not None and expiry < now:
+                raise ValueError(f"Key '{key}' not found")
+            value += delta
+            super().set(key, value,
+                        None if expiry is None else expiry - now, version)
+            return value
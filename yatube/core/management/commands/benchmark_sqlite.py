@@ -0,0 +1,121 @@
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.db import pragma_statements
+
+SCHEMA = (
+    'CREATE TABLE post (id INTEGER PRIMARY KEY, author_id INTEGER, '
+    'pub_date REAL, text TEXT)',
+    'CREATE INDEX post_author_idx ON post (author_id, pub_date DESC)',
+)
+READ_SQL = ('SELECT id, text FROM post WHERE author_id = ? '
+            'ORDER BY pub_date DESC LIMIT 10')
+WRITE_SQL = 'INSERT INTO post (author_id, pub_date, text) VALUES (?, ?, ?)'
+AUTHORS = 100
+
+
+class Worker(threading.Thread):
+    def __init__(self, path, pragmas, write, reconnect, deadline):
+        super().__init__()
+        self.path = path
+        self.pragmas = pragmas
+        self.write = write
+        self.reconnect = reconnect
+        self.deadline = deadline
+        self.done = 0
+        self.locked = 0
+
+    def connect(self):
+        # isolation_level=None - автокоммит, как у Django.
+        connection = sqlite3.connect(self.path, isolation_level=None)
+        for statement in pragma_statements(self.pragmas):
+            connection.execute(statement)
+        return connection
+
+    def run(self):
+        connection = self.connect()
+        while time.monotonic() < self.deadline:
+            if self.reconnect:
+                connection.close()
+                connection = self.connect()
+            try:
+                if self.write:
+                    connection.execute(WRITE_SQL, (
+                        random.randrange(AUTHORS), time.time(), 'x' * 200))
+                else:
+                    connection.execute(
+                        READ_SQL, (random.randrange(AUTHORS),)).fetchall()
+            except sqlite3.OperationalError:
+                self.locked += 1
+            else:
+                self.done += 1
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность SQLite с настройками по '
+            'умолчанию и с PRAGMAS из DATABASES при одновременных чтении '
+            'и записи')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=3)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=1)
+        parser.add_argument('--rows', type=int, default=20000)
+
+    def handle(self, *args, **options):
+        tuned = settings.DATABASES['default'].get('PRAGMAS', {})
+        # busy_timeout одинаковый, чтобы сравнивать только режим работы.
+        baseline = {'busy_timeout': tuned.get('busy_timeout', 5000)}
+        modes = (
+            ('по умолчанию', baseline, False),
+            ('PRAGMAS', tuned, False),
+            ('PRAGMAS, соединение на запрос', tuned, True),
+        )
+        for title, pragmas, reconnect in modes:
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'benchmark.sqlite3')
+                self._populate(path, options['rows'])
+                reads, writes, locked = self._run(
+                    path, pragmas, reconnect, options)
+            seconds = options['seconds']
+            self.stdout.write(
+                f'{title:>30}: чтений {reads / seconds:9.0f}/с, '
+                f'записей {writes / seconds:7.0f}/с, '
+                f'ошибок блокировки {locked}'
+            )
+
+    def _populate(self, path, rows):
+        connection = sqlite3.connect(path)
+        for statement in SCHEMA:
+            connection.execute(statement)
+        connection.executemany(WRITE_SQL, (
+            (random.randrange(AUTHORS), time.time(), 'x' * 200)
+            for _ in range(rows)
+        ))
+        connection.commit()
+        connection.close()
+
+    def _run(self, path, pragmas, reconnect, options):
+        deadline = time.monotonic() + options['seconds']
+        workers = [
+            Worker(path, pragmas, False, reconnect, deadline)
+            for _ in range(options['readers'])
+        ] + [
+            Worker(path, pragmas, True, reconnect, deadline)
+            for _ in range(options['writers'])
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        reads = sum(w.done for w in workers if not w.write)
+        writes = sum(w.done for w in workers if w.write)
+        return reads, writes, sum(w.locked for w in workers)
@@ -0,0 +1,77 @@
+"""Чтение с реплик базы.
+
+Представления, помеченные read_from_replica, читают с одной из баз
+REPLICA_DATABASES; все остальное, как и любая запись, идет в default.
+Реплика отстает от основной базы, поэтому пользователь, который только
+что что-то записал, REPLICA_PIN_SECONDS секунд читает из default
+(cookie REPLICA_PIN_COOKIE) и сразу видит свои изменения. После записи
+в самом запросе чтение в нем тоже переключается на default.
+
+Подключение::
+
+    DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+    MIDDLEWARE = [..., 'core.replicas.ReplicaPinMiddleware']
+"""
+import random
+import threading
+from functools import wraps
+
+from django.conf import settings
+
+_state = threading.local()
+
+
+def reading_replica():
+    '''Идет ли чтение текущего запроса с реплики.'''
+    return bool(
+        settings.REPLICA_DATABASES
+        and getattr(_state, 'replica', False)
+        and not getattr(_state, 'wrote', False)
+    )
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if reading_replica():
+            return random.choice(settings.REPLICA_DATABASES)
+        return None
+
+    def db_for_write(self, model, **hints):
+        _state.wrote = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики - копии default, объекты из них можно связывать.
+        return True
+
+
+def read_from_replica(view):
+    '''Читать данные view с реплики, если пользователь не закреплен.'''
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        # Пользователь сессии загружается из default, как и сама сессия.
+        if hasattr(request, 'user'):
+            request.user.is_authenticated
+        _state.replica = settings.REPLICA_PIN_COOKIE not in request.COOKIES
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _state.replica = False
+    return wrapper
+
+
+class ReplicaPinMiddleware:
+    '''Закрепить за default пользователя, который что-то записал.'''
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _state.wrote = False
+        response = self.get_response(request)
+        if _state.wrote and settings.REPLICA_DATABASES:
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE, '1',
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True, samesite='Lax',
+            )
+        return response
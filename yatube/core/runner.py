@@ -0,0 +1,49 @@
+"""Запуск тестов с кешем во временном каталоге.
+
+Общий уровень кеша в настройках - файлы в BASE_DIR/cache. Тесты
+получают на время прогона свой каталог, чтобы не писать в кеш
+запущенного сайта и не читать из него.
+
+Подключение::
+
+    TEST_RUNNER = 'core.runner.DiscoverRunner'
+"""
+import copy
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.test import runner
+from django.test.utils import override_settings
+
+FILE_BACKENDS = (
+    'django.core.cache.backends.filebased.FileBasedCache',
+    'core.cache.LockingFileBasedCache',
+)
+
+
+@contextmanager
+def isolated_caches():
+    '''Файловые кеши из CACHES - во временном каталоге.'''
+    directory = tempfile.mkdtemp(prefix='yatube-cache-')
+    caches = copy.deepcopy(settings.CACHES)
+    for alias, options in caches.items():
+        if options['BACKEND'] in FILE_BACKENDS:
+            options['LOCATION'] = f'{directory}/{alias}'
+    try:
+        with override_settings(CACHES=caches):
+            yield directory
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+class DiscoverRunner(runner.DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._caches = isolated_caches()
+        self._caches.__enter__()
+
+    def teardown_test_environment(self, **kwargs):
+        self._caches.__exit__(None, None, None)
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,52 @@
+"""Предварительная компиляция шаблонов.
+
+С cached.Loader шаблон компилируется при первом обращении, и первые
+запросы каждого процесса платят за разбор всех шаблонов страницы.
+precompile проходит по всем шаблонам, которые видят загрузчики
+движка, и кладет их в кеш загрузчика заранее, при запуске процесса.
+"""
+import logging
+import os
+
+from django.template import TemplateSyntaxError, engines
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_EXTENSIONS = ('.html', '.txt', '.xml')
+
+
+def _directories(loaders):
+    for loader in loaders:
+        # cached.Loader сам каталогов не знает, они у его загрузчиков.
+        if hasattr(loader, 'loaders'):
+            yield from _directories(loader.loaders)
+        else:
+            yield from loader.get_dirs()
+
+
+def template_names(engine):
+    '''Имена всех шаблонов из каталогов загрузчиков движка.'''
+    names = set()
+    for directory in _directories(engine.template_loaders):
+        for root, dirs, files in os.walk(directory):
+            for name in files:
+                if name.endswith(TEMPLATE_EXTENSIONS):
+                    path = os.path.relpath(os.path.join(root, name), directory)
+                    names.add(path.replace(os.sep, '/'))
+    return sorted(names)
+
+
+def precompile(using='django'):
+    '''Скомпилировать все шаблоны движка; вернуть их число.'''
+    engine = engines[using].engine
+    compiled = 0
+    for name in template_names(engine):
+        try:
+            engine.get_template(name)
+        except TemplateSyntaxError as error:
+            # Шаблоны сторонних приложений могут требовать библиотеки
+            # тегов, которых нет в проекте.
+            logger.warning('Шаблон %s не скомпилирован: %s', name, error)
+        else:
+            compiled += 1
+    return compiled
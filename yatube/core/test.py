@@ -1,4 +1,19 @@
-from django.test import TestCase
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection
+from django.template import engines
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         override_settings)
+
+from core.cache import LockingFileBasedCache, TwoTierCache
+from core.templating import precompile, template_names
+from core.views import serve_media
 
 
 class ViewTestClass(TestCase):
@@ -7,3 +22,211 @@ class ViewTestClass(TestCase):
         template = 'core/404.html'
         self.assertEqual(response.status_code, 404)
         self.assertTemplateUsed(response, template)
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'test-shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'test-shared',
+    },
+})
+class TwoTierCacheTests(SimpleTestCase):
+    """Два экземпляра TwoTierCache изображают два процесса
+    с общим кешем."""
+    def make_cache(self, **options):
+        options = {'SHARED': 'test-shared', 'SYNC_INTERVAL': 0, **options}
+        return TwoTierCache(None, {'OPTIONS': options})
+
+    def setUp(self):
+        self.first = self.make_cache()
+        self.second = self.make_cache()
+        self.first.clear()
+
+    def test_value_is_shared(self):
+        """Значение, записанное одним процессом, видно другому."""
+        self.first.set('key', 'value')
+        self.assertEqual(self.second.get('key'), 'value')
+
+    def test_local_tier_serves_repeated_reads(self):
+        """Повторное чтение обслуживает локальный уровень."""
+        self.first.set('key', 'value')
+        LocMemCache('test-shared', {}).set('key', 'changed')
+        self.assertEqual(self.first.get('key'), 'value')
+
+    def test_incr_invalidates_other_processes(self):
+        """incr в одном процессе сбрасывает локальный уровень другого."""
+        self.first.set('version', 1)
+        self.assertEqual(self.second.get('version'), 1)
+        self.first.incr('version')
+        self.assertEqual(self.second.get('version'), 2)
+
+    def test_delete_invalidates_other_processes(self):
+        """delete в одном процессе виден другому."""
+        self.first.set('key', 'value')
+        self.assertEqual(self.second.get('key'), 'value')
+        self.first.delete('key')
+        self.assertIsNone(self.second.get('key'))
+
+    def test_set_invalidates_other_processes(self):
+        """Перезапись значения в одном процессе видна другому."""
+        self.first.set('key', 'value')
+        self.assertEqual(self.second.get('key'), 'value')
+        self.first.set('key', 'changed')
+        self.assertEqual(self.second.get('key'), 'changed')
+
+    def test_change_keeps_other_local_keys(self):
+        """Изменение ключа убирает из локального уровня только его."""
+        self.first.set_many({'key': 'value', 'other': 'value'})
+        self.assertEqual(len(self.second.get_many(['key', 'other'])), 2)
+        LocMemCache('test-shared', {}).set('other', 'changed')
+        self.first.delete('key')
+        self.assertIsNone(self.second.get('key'))
+        self.assertEqual(self.second.get('other'), 'value')
+
+    def test_clear_invalidates_other_processes(self):
+        """clear сбрасывает локальный уровень всех процессов."""
+        self.first.set('key', 'value')
+        self.assertEqual(self.second.get('key'), 'value')
+        self.first.clear()
+        self.assertIsNone(self.second.get('key'))
+
+    def test_lost_log_clears_local_tier(self):
+        """Без записей журнала локальный уровень сбрасывается целиком."""
+        self.first.set('key', 'value')
+        self.assertEqual(self.second.get('key'), 'value')
+        self.first.set('key', 'changed')
+        LocMemCache('test-shared', {}).clear()
+        self.assertIsNone(self.second.get('key'))
+
+    def test_local_tier_is_bounded(self):
+        """Локальный уровень хранит не больше LOCAL_MAX_ENTRIES ключей."""
+        cache = self.make_cache(LOCAL_MAX_ENTRIES=2)
+        for key in ('a', 'b', 'c'):
+            cache.set(key, key)
+        self.assertEqual(len(cache._local), 2)
+        self.assertEqual(cache.get('a'), 'a')
+
+    def test_add_and_get_many(self):
+        """add не перезаписывает значение, get_many читает оба уровня."""
+        self.assertTrue(self.first.add('key', 'value'))
+        self.assertFalse(self.second.add('key', 'other'))
+        self.second.set('other', 'value')
+        self.assertEqual(
+            self.first.get_many(['key', 'other', 'missing']),
+            {'key': 'value', 'other': 'value'},
+        )
+
+
+class LockingFileBasedCacheTests(SimpleTestCase):
+    """add и incr файлового кеша атомарны между процессами"""
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.location)
+
+    def make_cache(self):
+        return LockingFileBasedCache(self.location, {})
+
+    def run_threads(self, target, number=8):
+        threads = [threading.Thread(target=target) for _ in range(number)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def test_concurrent_incr_is_not_lost(self):
+        """Одновременные incr из разных экземпляров не теряются."""
+        self.make_cache().set('counter', 0, None)
+
+        def increment():
+            cache = self.make_cache()
+            for _ in range(25):
+                cache.incr('counter')
+
+        self.run_threads(increment)
+        self.assertEqual(self.make_cache().get('counter'), 200)
+
+    def test_concurrent_add_succeeds_once(self):
+        """Из одновременных add ключ получает только один."""
+        added = []
+
+        def add():
+            added.append(self.make_cache().add('lock', 1))
+
+        self.run_threads(add)
+        self.assertEqual(added.count(True), 1)
+
+    def test_incr_keeps_timeout(self):
+        """incr не меняет срок жизни значения."""
+        cache = self.make_cache()
+        cache.set('forever', 1, None)
+        cache.set('expired', 1, -1)
+        self.assertEqual(cache.incr('forever', 2), 3)
+        with open(cache._key_to_file('forever'), 'rb') as file:
+            self.assertIsNone(pickle.load(file))
+        with self.assertRaises(ValueError):
+            cache.incr('expired')
+
+
+class ServeMediaTests(SimpleTestCase):
+    """Заголовки кеширования файлов из MEDIA_ROOT"""
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.immutable = 'posts/ab/' + 'ab' * 32 + '.gif'
+        for name in (self.immutable, 'posts/small.gif'):
+            os.makedirs(os.path.join(self.root, os.path.dirname(name)),
+                        exist_ok=True)
+            with open(os.path.join(self.root, name), 'wb') as file:
+                file.write(b'GIF89a')
+
+    def get(self, path):
+        request = RequestFactory().get(f'/media/{path}')
+        return serve_media(request, path, document_root=self.root)
+
+    def test_content_addressed_file_is_immutable(self):
+        """Картинка с именем по хешу кешируется бессрочно."""
+        self.assertIn('immutable', self.get(self.immutable)['Cache-Control'])
+
+    def test_other_files_are_not_immutable(self):
+        """Прочие файлы бессрочно не кешируются."""
+        self.assertFalse(self.get('posts/small.gif').has_header(
+            'Cache-Control'))
+
+
+class SqlitePragmasTests(TestCase):
+    """PRAGMA из настроек применяются к соединению"""
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_are_applied(self):
+        """synchronous и cache_size берутся из PRAGMAS."""
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('cache_size'), -64 * 1024)
+
+
+@override_settings(TEMPLATES=[{
+    'BACKEND': 'django.template.backends.django.DjangoTemplates',
+    'DIRS': settings.TEMPLATES[0]['DIRS'],
+    'OPTIONS': {
+        'context_processors': settings.TEMPLATES[0]['OPTIONS'][
+            'context_processors'],
+        'loaders': [('django.template.loaders.cached.Loader',
+                     settings.TEMPLATE_SOURCE_LOADERS)],
+    },
+}])
+class PrecompileTemplatesTests(SimpleTestCase):
+    """Шаблоны компилируются заранее в кеш загрузчика"""
+    def test_all_templates_are_cached(self):
+        """precompile кладет в cached.Loader все шаблоны проекта."""
+        engine = engines['django'].engine
+        names = template_names(engine)
+        self.assertIn('posts/index.html', names)
+        self.assertIn('admin/base.html', names)
+        self.assertEqual(precompile(), len(names))
+        cached = engine.template_loaders[0].get_template_cache
+        self.assertTrue(set(names) <= set(cached))
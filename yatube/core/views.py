@@ -1,4 +1,8 @@
+import re
+
+from django.conf import settings
 from django.shortcuts import render
+from django.views.static import serve
 
 
 def page_not_found(request, exception):
@@ -15,3 +19,14 @@ def page_is_forbidden(request, exception):
 
 def internal_server_error(request):
     return render(request, 'core/500.html', {'path': request.path}, status=500)
+
+
+def serve_media(request, path, document_root=None):
+    '''Отдать файл из MEDIA_ROOT (только при DEBUG, в бою - nginx).
+
+    Файлы с неизменяемым адресом кешируются браузером бессрочно.
+    '''
+    response = serve(request, path, document_root=document_root)
+    if re.match(settings.MEDIA_IMMUTABLE_RE, path):
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
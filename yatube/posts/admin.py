@@ -1,15 +1,70 @@
+from django.conf import settings
 from django.contrib import admin
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
 
+from core.db import estimated_count
+
+from . import caching, search
 from .models import Group, Post, Comment, Follow
 
+GROUP_CHOICES_KEY = 'posts:admin:group-choices:{}'
+
+
+class EstimatedCountPaginator(Paginator):
+    '''Для всей большой таблицы число строк берется из статистики базы.
+
+    COUNT(*) по миллионам строк дороже самой страницы; точное число
+    нужно, только когда список отфильтрован.
+    '''
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_count(queryset.model, queryset.db)
+            if (estimate is not None
+                    and estimate >= settings.ADMIN_ESTIMATED_COUNT_MIN):
+                return estimate
+        return super().count
+
 
 class PostAdmin(admin.ModelAdmin):
     list_display = ('pk', 'text', 'pub_date', 'author', 'group')
+    list_select_related = ('author', 'group')
     search_fields = ('text',)
+    # Ссылки фильтра - готовые диапазоны дат, запросов он не делает.
+    # date_hierarchy не подходит: он ищет MIN/MAX и DISTINCT даты по
+    # всей таблице на каждую загрузку списка.
     list_filter = ('pub_date',)
     list_editable = ('group',)
+    raw_id_fields = ('author',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = '-пусто-'
 
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        field = super().formfield_for_foreignkey(db_field, request, **kwargs)
+        if db_field.name == 'group':
+            # Один список групп на все строки списка постов вместо
+            # запроса на каждый <select>; версия GROUPS меняется при
+            # каждом изменении групп.
+            version, = caching.get_versions(caching.GROUPS)
+            field.choices = cache.get_or_set(
+                GROUP_CHOICES_KEY.format(version),
+                # Не list(): он вызвал бы еще и COUNT(*) по группам.
+                lambda: [choice for choice in field.choices],
+                settings.PAGE_CACHE_TIMEOUT,
+            )
+        return field
+
+    def get_search_results(self, request, queryset, search_term):
+        words = search.terms(search_term)
+        if not words or not search.is_available(queryset.db):
+            return super().get_search_results(
+                request, queryset, search_term)
+        return search.matching(queryset, words), False
+
 
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group)
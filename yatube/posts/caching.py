@@ -0,0 +1,177 @@
+"""Версионированные ключи кеша страниц.
+
+У каждой области - общей ленты, группы, автора, поста, ленты подписок
+пользователя - есть номер версии в кеше. Ключ фрагмента страницы
+собирается из версий областей, от которых она зависит, а сигналы
+моделей увеличивают версии затронутых областей. Устаревшие фрагменты
+больше не читаются и доживают свой срок в кеше, поэтому срок жизни
+фрагментов можно делать долгим.
+
+Версия - время последнего изменения области в наносекундах. Если
+страница читается с реплики вскоре после изменения, реплика может еще
+отставать, и фрагмент кешируется лишь на REPLICA_PIN_SECONDS.
+"""
+import hashlib
+import math
+import random
+import time
+from collections import Counter
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from core.replicas import reading_replica
+
+INDEX = 'index'
+# Группы выводятся в карточках любых лент.
+GROUPS = 'groups'
+
+VERSION_KEY = 'posts:version:{}'
+VIEW_KEY = 'posts:view:{}:{}'
+
+# Попадания, промахи, выдача устаревшего и пересчеты
+# stale_while_revalidate в текущем процессе.
+metrics = Counter()
+
+
+def group_scope(group_id):
+    return f'group:{group_id}'
+
+
+def profile_scope(user_id):
+    return f'profile:{user_id}'
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def follow_scope(user_id):
+    return f'follow:{user_id}'
+
+
+def _initial_version():
+    # Версия, вытесненная из кеша, не должна совпасть с прежней.
+    return time.time_ns()
+
+
+def get_versions(*scopes):
+    keys = [VERSION_KEY.format(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    for key in missing:
+        version = _initial_version()
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+        versions[key] = version
+    return [versions[key] for key in keys]
+
+
+def bump(*scopes):
+    '''Сделать недействительными фрагменты областей scopes.'''
+    for scope in set(scopes):
+        key = VERSION_KEY.format(scope)
+        now = time.time_ns()
+        try:
+            # incr атомарен; версия дорастает до текущего времени.
+            cache.incr(key, max(1, now - cache.get(key, now)))
+        except ValueError:
+            cache.set(key, now, None)
+
+
+def cache_timeout(versions, timeout):
+    '''Срок жизни закешированного по версиям областей versions.
+
+    Пока реплика может отставать от последнего изменения, срок
+    сокращается до REPLICA_PIN_SECONDS.
+    '''
+    if versions and reading_replica():
+        lag = settings.REPLICA_PIN_SECONDS
+        if time.time_ns() - max(versions) < lag * 10 ** 9:
+            return min(timeout, lag)
+    return timeout
+
+
+def page_cache_context(request, *scopes):
+    '''Ключ и срок жизни кешируемого фрагмента страницы.'''
+    versions = get_versions(*scopes)
+    parts = [f'{scope}={version}' for scope, version in zip(scopes, versions)]
+    parts += [request.GET.get('cursor', ''), request.GET.get('page', '')]
+    return {
+        'page_cache_key': ':'.join(parts),
+        'page_cache_timeout': cache_timeout(
+            versions, settings.PAGE_CACHE_TIMEOUT),
+    }
+
+
+def _compute_early(entry, now, beta):
+    # Вероятностное досрочное обновление (XFetch): чем дольше считается
+    # страница и чем ближе срок, тем вероятнее пересчет до истечения.
+    return now - entry['delta'] * beta * math.log(1 - random.random()) >= (
+        entry['expires'])
+
+
+def stale_while_revalidate(scopes=(), timeout=None, stale_timeout=None,
+                           beta=1.0):
+    '''Кешировать ответ view для анонимных пользователей.
+
+    Когда запись устарела (истек срок или сменилась версия областей
+    scopes), страницу пересчитывает один процесс, получивший блокировку
+    в кеше, а остальные в это время получают устаревший ответ.
+    '''
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (request.method not in ('GET', 'HEAD')
+                    or request.user.is_authenticated):
+                return view(request, *args, **kwargs)
+            path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+            key = VIEW_KEY.format(view.__name__, path)
+            lock_key = f'{key}:lock'
+            versions = get_versions(*scopes)
+            tag = ':'.join(map(str, versions))
+            now = time.time()
+            entry = cache.get(key)
+            if entry is None:
+                metrics['miss'] += 1
+            elif entry['tag'] == tag and not _compute_early(entry, now, beta):
+                metrics['hit'] += 1
+                return _response(entry)
+            locked = cache.add(lock_key, 1, settings.PAGE_CACHE_LOCK_TIMEOUT)
+            if entry is not None and not locked:
+                metrics['stale'] += 1
+                return _response(entry)
+            try:
+                metrics['refresh'] += 1
+                response = view(request, *args, **kwargs)
+                if response.status_code == 200 and not response.streaming:
+                    _store(key, tag, response, time.time() - now,
+                           versions, timeout, stale_timeout)
+            finally:
+                if locked:
+                    cache.delete(lock_key)
+            return response
+        return wrapper
+    return decorator
+
+
+def _store(key, tag, response, delta, versions, timeout, stale_timeout):
+    if timeout is None:
+        timeout = settings.PAGE_CACHE_TIMEOUT
+    timeout = cache_timeout(versions, timeout)
+    if stale_timeout is None:
+        stale_timeout = settings.PAGE_CACHE_STALE_TIMEOUT
+    entry = {
+        'tag': tag,
+        'content': response.content,
+        'content_type': response['Content-Type'],
+        'delta': delta,
+        'expires': time.time() + timeout,
+    }
+    cache.set(key, entry, timeout + stale_timeout)
+
+
+def _response(entry):
+    return HttpResponse(entry['content'], content_type=entry['content_type'])
@@ -0,0 +1,93 @@
+"""Денормализованные счетчики постов, комментариев и подписок.
+
+Счетчики меняются атомарным UPDATE ... SET x = x + 1 из сигналов
+моделей, поэтому профиль и страница поста не считают строки в
+posts_post. Массовые операции (bulk_create, update) сигналов не
+посылают - после них счетчики пересобирает rebuild_counters.
+"""
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Post, User, UserCounters
+
+
+def _change(queryset, field, delta):
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    return queryset.update(**{field: F(field) + delta})
+
+
+def _table_counts(user_id):
+    return {
+        'posts_count': Post.objects.filter(author_id=user_id).count(),
+        'followers_count': Follow.objects.filter(author_id=user_id).count(),
+        'following_count': Follow.objects.filter(user_id=user_id).count(),
+    }
+
+
+def _create(user_id):
+    '''Строка счетчиков, посчитанных по таблицам, и создана ли она.'''
+    return UserCounters.objects.get_or_create(
+        user_id=user_id, defaults=_table_counts(user_id))
+
+
+def change_user_counter(user_id, field, delta):
+    counters = UserCounters.objects.filter(user_id=user_id)
+    if _change(counters, field, delta):
+        return
+    # Новая строка считается по таблицам, где изменение уже есть.
+    _, created = _create(user_id)
+    if not created:
+        _change(counters, field, delta)
+
+
+def for_user(user):
+    '''Счетчики пользователя, создаются, если их строки нет.
+
+    Строку создает сигнал при регистрации, но пользователи из
+    bulk_create и loaddata (raw) остаются без нее; для них счетчики
+    один раз считаются по таблицам.
+    '''
+    try:
+        return user.counters
+    except UserCounters.DoesNotExist:
+        pass
+    user.counters, _ = _create(user.pk)
+    return user.counters
+
+
+def change_comments_counter(post_id, delta, thread=False):
+    '''Изменить число комментариев поста, для корня ветки - и число веток.'''
+    fields = ('comments_count', 'threads_count') if thread else (
+        'comments_count',)
+    for field in fields:
+        _change(Post.objects.filter(pk=post_id), field, delta)
+
+
+def _count(queryset, field):
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(count=Count('pk'))
+        .values('count')
+    ), 0)
+
+
+def rebuild():
+    '''Пересчитать все счетчики по данным таблиц.'''
+    UserCounters.objects.bulk_create(
+        [UserCounters(user_id=pk)
+         for pk in User.objects.filter(counters__isnull=True)
+         .values_list('pk', flat=True)],
+        ignore_conflicts=True,
+    )
+    UserCounters.objects.update(
+        posts_count=_count(Post.objects.all(), 'author'),
+        followers_count=_count(Follow.objects.all(), 'author'),
+        following_count=_count(Follow.objects.all(), 'user'),
+    )
+    Post.objects.update(
+        comments_count=_count(Comment.objects.all(), 'post'),
+        threads_count=_count(Comment.objects.filter(depth=0), 'post'),
+    )
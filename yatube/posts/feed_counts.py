@@ -0,0 +1,98 @@
+"""Число постов в лентах для паджинатора.
+
+COUNT(*) с фильтром ленты - самый дорогой запрос страницы, поэтому
+число постов общей ленты и лент групп хранится в кеше: сигналы при
+создании, удалении и переносе поста в другую группу меняют его через
+incr, а вытесненное значение один раз считается заново. Для общей
+ленты больше FEED_ESTIMATED_COUNT_MIN постов вместо COUNT(*) берется
+оценка по статистике ANALYZE, дальше ее так же поправляют сигналы.
+
+Число постов автора уже есть в UserCounters.posts_count. Лента
+подписок в режиме pull - сумма этих счетчиков по авторам из подписок,
+в режиме push число считается по ленте, кешируется и сбрасывается,
+когда в ленте меняется состав постов.
+
+Массовые операции сигналов не посылают - после них числа сбрасывает
+rebuild_counters.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+
+from core.db import estimated_count
+
+from . import caching, timeline
+from .models import Follow, Group, Post, User, UserCounters
+
+COUNT_KEY = 'posts:count:{}'
+
+
+def _key(scope):
+    return COUNT_KEY.format(scope)
+
+
+def _cached(scope, compute):
+    key = _key(scope)
+    count = cache.get(key)
+    if count is None:
+        count = compute()
+        # add, а не set: не затереть значение, которое успели
+        # посчитать и поправить другие процессы.
+        cache.add(key, count, settings.FEED_COUNT_TIMEOUT)
+    return count
+
+
+def index_count(posts):
+    '''Число постов общей ленты.'''
+    def compute():
+        estimate = estimated_count(Post, posts.db)
+        if (estimate is not None
+                and estimate >= settings.FEED_ESTIMATED_COUNT_MIN):
+            return estimate
+        return posts.count()
+    return _cached(caching.INDEX, compute)
+
+
+def group_count(group_id, posts):
+    '''Число постов ленты группы.'''
+    return _cached(caching.group_scope(group_id), posts.count)
+
+
+def follow_count(user, posts):
+    '''Число постов ленты подписок пользователя.'''
+    if timeline.is_push_mode():
+        return _cached(caching.follow_scope(user.pk), posts.count)
+    return UserCounters.objects.using(posts.db).filter(
+        user__following__user=user
+    ).aggregate(count=Sum('posts_count'))['count'] or 0
+
+
+def change(scope, delta):
+    '''Поправить число постов ленты scope.'''
+    try:
+        cache.incr(_key(scope), delta)
+    except ValueError:
+        # Числа нет в кеше - его посчитают при следующем чтении.
+        pass
+
+
+def forget_follow_counts(user_ids):
+    '''Сбросить число постов лент подписок пользователей.'''
+    cache.delete_many(
+        [_key(caching.follow_scope(user_id)) for user_id in user_ids])
+
+
+def forget_followers_counts(author_id):
+    '''Сбросить число постов лент подписок всех подписчиков автора.'''
+    forget_follow_counts(Follow.objects.filter(
+        author_id=author_id).values_list('user_id', flat=True))
+
+
+def forget_all():
+    '''Сбросить все числа постов лент, например после bulk_create.'''
+    scopes = [caching.INDEX]
+    scopes += [caching.group_scope(pk)
+               for pk in Group.objects.values_list('pk', flat=True)]
+    scopes += [caching.follow_scope(pk)
+               for pk in User.objects.values_list('pk', flat=True)]
+    cache.delete_many([_key(scope) for scope in scopes])
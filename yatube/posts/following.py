@@ -0,0 +1,60 @@
+"""Кеш подписок пользователя.
+
+Проверка "подписан ли я на автора" нужна на странице автора, при
+подписке и для кнопки подписки у каждой карточки ленты. Вместо запроса
+на каждую проверку все подписки пользователя один раз читаются в
+отсортированный массив id авторов (array('Q'), 8 байт на автора)
+и кешируются; проверка - двоичный поиск в памяти.
+
+Ключ кеша включает версию ленты подписок пользователя
+(caching.follow_scope), которую сигналы меняют при подписке и отписке,
+поэтому устаревший массив больше не читается. В пределах запроса массив
+запоминается на объекте пользователя.
+"""
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import caching
+from .models import Follow
+
+FOLLOWING_KEY = 'posts:following:{}:{}'
+
+
+def _load(user_id):
+    return array('Q', Follow.objects.filter(user_id=user_id).order_by(
+        'author_id').values_list('author_id', flat=True))
+
+
+def following_ids(user):
+    '''Отсортированный массив id авторов, на которых подписан user.'''
+    if not user.is_authenticated:
+        return array('Q')
+    ids = getattr(user, '_following_ids', None)
+    if ids is None:
+        versions = caching.get_versions(caching.follow_scope(user.pk))
+        ids = cache.get_or_set(
+            FOLLOWING_KEY.format(user.pk, *versions),
+            lambda: _load(user.pk),
+            caching.cache_timeout(versions, settings.PAGE_CACHE_TIMEOUT),
+        )
+        user._following_ids = ids
+    return ids
+
+
+def _contains(ids, author_id):
+    position = bisect_left(ids, author_id)
+    return position < len(ids) and ids[position] == author_id
+
+
+def is_following(user, author_id):
+    '''Подписан ли user на автора author_id.'''
+    return _contains(following_ids(user), author_id)
+
+
+def following_among(user, author_ids):
+    '''Те из author_ids, на кого подписан user, - одним чтением кеша.'''
+    ids = following_ids(user)
+    return {pk for pk in author_ids if _contains(ids, pk)}
@@ -1,6 +1,21 @@
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
 from django.forms import ModelForm
 
 from .models import Post, Comment
+from .uploads import check_dimensions, normalize_image
+
+# Больше id в INTEGER SQLite не бывает.
+MAX_ID = 2 ** 63 - 1
+
+
+def _comment_id(value):
+    '''id комментария из скрытого поля или None, если это не id.'''
+    # isdigit() без isascii() пропустил бы "²" и "٣".
+    if not (value.isascii() and value.isdigit()):
+        return None
+    pk = int(value)
+    return pk if 0 < pk <= MAX_ID else None
 
 
 class PostForm(ModelForm):
@@ -17,6 +32,29 @@ class PostForm(ModelForm):
             'group': "Группа, к которой будет относиться пост",
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Загрузку, отброшенную ImageUploadHandler, поле не получает:
+        # ошибка выводится из clean_image.
+        key = self.add_prefix('image')
+        self.image_upload_error = getattr(
+            self.files.get(key), 'upload_error', None)
+        if self.image_upload_error:
+            self.files = self.files.copy()
+            del self.files[key]
+
+    def clean_image(self):
+        '''Проверить размеры, удалить EXIF и уменьшить картинку.'''
+        if self.image_upload_error:
+            raise ValidationError(self.image_upload_error)
+        image = self.cleaned_data['image']
+        if isinstance(image, UploadedFile):
+            error = check_dimensions(*image.image.size)
+            if error:
+                raise ValidationError(error)
+            return normalize_image(image)
+        return image
+
 
 class CommentForm(ModelForm):
     class Meta:
@@ -29,3 +67,20 @@ class CommentForm(ModelForm):
         help_texts = {
             'text': "Текст комментария",
         }
+
+    def __init__(self, *args, post=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.post = post
+
+    def clean(self):
+        cleaned_data = super().clean()
+        # id комментария, на который пишется ответ, приходит скрытым
+        # полем parent, отвечать можно только в том же посте.
+        parent = self.data.get('parent')
+        if parent:
+            self.instance.parent = Comment.objects.filter(
+                post=self.post, pk=_comment_id(parent)).first()
+            if self.instance.parent is None:
+                raise ValidationError(
+                    'Комментарий, на который вы отвечаете, не найден.')
+        return cleaned_data
@@ -0,0 +1,116 @@
+import itertools
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import search
+from posts.models import Group, Post, User
+from posts.paginators import CursorPaginator
+from posts.views import POSTS_PER_PAGE
+
+GROUPS = 50
+# Сколько самых частых и сколько случайных редких слов искать.
+COMMON_QUERIES = 5
+
+
+class Rollback(Exception):
+    '''Откатить синтетические данные после замеров.'''
+
+
+def _word(alphabet='абвгдежзиклмнопрстуфхцчшэюя'):
+    return ''.join(random.choices(alphabet, k=random.randint(3, 9)))
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает поиск постов через LIKE и через полнотекстовый '
+            'индекс FTS5 на синтетических данных: запросы те же, что '
+            'у страницы поиска. Нужна база с миграциями; данные '
+            'добавляются в транзакции и откатываются после замеров')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=20000)
+        parser.add_argument('--words', type=int, default=60,
+                            help='Слов в одном посте.')
+        parser.add_argument('--vocabulary', type=int, default=20000)
+        parser.add_argument('--queries', type=int, default=20,
+                            help='Редких слов для поиска.')
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            self.stderr.write('В этой базе нет FTS5')
+            return
+        random.seed(0)
+        # Частота слов убывает по закону Ципфа: первые слова словаря
+        # есть почти в каждом посте, остальные редки.
+        vocabulary = list({_word() for _ in range(options['vocabulary'])})
+        weights = list(itertools.accumulate(
+            1 / rank for rank in range(1, len(vocabulary) + 1)))
+        queries = (
+            ('частые', vocabulary[:COMMON_QUERIES]),
+            ('редкие', random.sample(vocabulary[len(vocabulary) // 2:],
+                                     options['queries'])),
+        )
+        try:
+            with transaction.atomic():
+                started = time.perf_counter()
+                self._populate(vocabulary, weights, options)
+                self.stdout.write(
+                    f'Постов: {options["posts"]}, заполнение с индексом: '
+                    f'{time.perf_counter() - started:.1f} с'
+                )
+                for title, words in queries:
+                    like = self._measure(words, self._like)
+                    fts = self._measure(words, self._match)
+                    self.stdout.write(
+                        f'{title}: LIKE {like / len(words) * 1000:8.2f} '
+                        f'мс/запрос, FTS5 {fts / len(words) * 1000:8.2f} '
+                        f'мс/запрос, быстрее в {like / max(fts, 1e-9):.0f} '
+                        f'раз'
+                    )
+                raise Rollback
+        except Rollback:
+            pass
+
+    def _populate(self, vocabulary, weights, options):
+        author = User.objects.create_user(
+            username=f'benchmark-{time.time_ns()}')
+        groups = Group.objects.bulk_create([
+            Group(title=f'{_word()} {_word()}', slug=f'benchmark-{pk}')
+            for pk in range(GROUPS)
+        ])
+        words = options['words']
+        texts = (
+            ' '.join(random.choices(vocabulary, cum_weights=weights, k=words))
+            for _ in range(options['posts'])
+        )
+        posts = (
+            Post(text=text, author=author,
+                 group=random.choice(groups + [None]))
+            for text in texts
+        )
+        # Больше строк в одном INSERT SQLite не принимает.
+        Post.objects.bulk_create(posts, batch_size=500)
+        search.rebuild()
+
+    def _measure(self, words, run):
+        started = time.perf_counter()
+        for word in words:
+            run(word)
+        return time.perf_counter() - started
+
+    def _page(self, posts, count):
+        '''Первая и вторая страницы, как их листает страница поиска.'''
+        paginator = CursorPaginator(posts, POSTS_PER_PAGE,
+                                    ordering=('rank', 'pk'), count=count)
+        page = paginator.get_page(1)
+        if page.next_cursor:
+            paginator.get_cursor_page(page.next_cursor)
+
+    def _like(self, word):
+        posts = search.containing(Post.objects.for_feed(), [word])
+        self._page(posts, posts.count())
+
+    def _match(self, word):
+        self._page(*search.search_posts(word))
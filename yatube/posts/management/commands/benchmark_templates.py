@@ -0,0 +1,116 @@
+import copy
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.template import engines
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from core.templating import template_names
+from posts.forms import CommentForm, PostForm
+from posts.models import Comment, Group, Post, User, UserCounters
+from posts.paginators import elided_page_range
+
+# Фрагменты страниц не должны браться из кеша: меряется рендеринг.
+NO_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+}
+CURSOR = 'WyJuIiwyLFsiMjAyNi0wMS0wMVQwMDowMDowMCIsMV1d'
+PAGES_OF_POSTS = 10
+
+
+def _page(object_list, per_page):
+    '''Первая страница с курсорами, как у CursorPaginator.'''
+    page = Paginator(object_list * PAGES_OF_POSTS, per_page).page(1)
+    page.next_cursor = page.last_cursor = CURSOR
+    page.previous_cursor = None
+    page.elided_page_range = elided_page_range(1, page.paginator.num_pages)
+    return page
+
+
+def _context(template, size):
+    '''Контекст страницы с size постами или комментариями.'''
+    now = timezone.now()
+    author = User(pk=1, username='author', first_name='Автор',
+                  last_name='Бенчмарка')
+    author.counters = UserCounters(posts_count=size * PAGES_OF_POSTS)
+    group = Group(pk=1, title='Группа', slug='group',
+                  description='Описание группы')
+    posts = [
+        Post(pk=pk, text=f'Текст поста {pk} ' * 20, author=author,
+             group=group, pub_date=now, updated=now)
+        for pk in range(1, size + 1)
+    ]
+    comments = [
+        Comment(pk=pk, post=posts[0], author=author, created=now,
+                text=f'Комментарий {pk}', depth=pk % 3)
+        for pk in range(1, size + 1)
+    ]
+    if template == 'posts/create_post.html':
+        return {'form': PostForm()}
+    return {
+        'page_obj': _page(posts, size),
+        'group': group,
+        'profile': author,
+        'following': False,
+        'post': posts[0],
+        'form': CommentForm(post=posts[0]),
+        'comments_page': _page(comments, size),
+        'comments': comments,
+        'query': 'текст',
+        'page_query': 'q=%D1%82%D0%B5%D0%BA%D1%81%D1%82&',
+        'page_cache_key': 'benchmark',
+        'page_cache_timeout': 0,
+    }
+
+
+def _cached_templates():
+    templates = copy.deepcopy(settings.TEMPLATES)
+    options = templates[0]['OPTIONS']
+    options['loaders'] = [('django.template.loaders.cached.Loader',
+                           settings.TEMPLATE_SOURCE_LOADERS)]
+    return templates
+
+
+class Command(BaseCommand):
+    help = ('Замеряет время рендеринга каждой страницы posts/*.html '
+            'с разным числом постов без кеша загрузчика и с ним')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+',
+                            default=[10, 100])
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        modes = (
+            ('загрузчики из настроек', settings.TEMPLATES),
+            ('cached.Loader', _cached_templates()),
+        )
+        for title, templates in modes:
+            with override_settings(TEMPLATES=templates, CACHES=NO_CACHE):
+                self.stdout.write(f'{title}:')
+                self._run(request, options)
+
+    def _run(self, request, options):
+        engine = engines['django'].engine
+        pages = [name for name in template_names(engine)
+                 if name.startswith('posts/') and name.count('/') == 1]
+        for name in pages:
+            timings = []
+            for size in options['sizes']:
+                context = _context(name, size)
+                render_to_string(name, context, request)
+                started = time.perf_counter()
+                for _ in range(options['repeat']):
+                    render_to_string(name, context, request)
+                elapsed = time.perf_counter() - started
+                timings.append(f'{size:>4}: '
+                               f'{elapsed / options["repeat"] * 1000:7.2f} мс')
+            self.stdout.write(f'{name:>28}  ' + '  '.join(timings))
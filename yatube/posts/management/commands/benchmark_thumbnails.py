@@ -0,0 +1,79 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.parsers import parse_geometry
+
+from posts import thumbnails
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp')
+
+
+def _collect(paths):
+    for path in paths:
+        if os.path.isfile(path):
+            yield path
+            continue
+        for root, dirs, files in os.walk(path):
+            for name in sorted(files):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    yield os.path.join(root, name)
+
+
+def _encode(image, path, geometry_string, options):
+    '''Размер миниатюры в байтах так, как ее готовит sorl.'''
+    options = thumbnails.backend.get_options(ImageFile(path), options)
+    options['image_info'] = default.engine.get_image_info(image)
+    ratio = default.engine.get_image_ratio(image, options)
+    geometry = parse_geometry(geometry_string, ratio)
+    thumbnail = default.engine.create(image, geometry, options)
+    data = default.engine._get_raw_data(
+        thumbnail, options['format'], options['quality'],
+        image_info=options['image_info'],
+        progressive=options.get('progressive', False),
+    )
+    return len(data)
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает размер вариантов картинки по ширине с прежней '
+            'миниатюрой 960x339 на наборе изображений')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths', nargs='*',
+            help='Файлы или каталоги; по умолчанию MEDIA_ROOT/posts.',
+        )
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or [
+            os.path.join(settings.MEDIA_ROOT, 'posts')]
+        files = list(_collect(paths))
+        if not files:
+            raise CommandError('Не найдено ни одного изображения')
+        totals = dict.fromkeys(thumbnails.SIZES, 0)
+        spent = dict.fromkeys(thumbnails.SIZES, 0.0)
+        for path in files:
+            with Image.open(path) as image:
+                image.load()
+                for size, (geometry, size_options) in (
+                        thumbnails.SIZES.items()):
+                    started = time.perf_counter()
+                    totals[size] += _encode(
+                        image, path, geometry, size_options)
+                    spent[size] += time.perf_counter() - started
+        self.stdout.write(
+            f'Изображений: {len(files)}, формат вариантов: '
+            f'{thumbnails.VARIANT_FORMAT}'
+        )
+        baseline = totals['card']
+        for size, total in totals.items():
+            self.stdout.write(
+                f'{size:>10}: {total / len(files) / 1024:8.1f} КБ/шт, '
+                f'{total / baseline:6.1%} от card, '
+                f'{spent[size] / len(files) * 1000:6.1f} мс/шт'
+            )
@@ -0,0 +1,135 @@
+import time
+from itertools import islice
+from multiprocessing import Pool, cpu_count
+
+import django
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import connections
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from posts import caching, thumbnails
+from posts.models import Post
+
+
+def _init_worker():
+    # При запуске через spawn дочерний процесс начинает с чистого листа.
+    if not apps.ready:
+        django.setup()
+
+
+def _source(name):
+    # Имя из values_list без хранилища поля sorl отнес бы
+    # к хранилищу по умолчанию.
+    return ImageFile(name, Post._meta.get_field('image').storage)
+
+
+def _chunks(ids, size):
+    ids = iter(ids)
+    return iter(lambda: list(islice(ids, size)), [])
+
+
+def _stream(ids, size):
+    try:
+        yield from _chunks(ids, size)
+    finally:
+        # Задания пулу выдает его поток, и id читаются через его
+        # собственное соединение.
+        connections.close_all()
+
+
+def _generate(task):
+    ids, force = task
+    results = []
+    scopes = set()
+    posts = Post.objects.filter(pk__in=ids).exclude(image='').order_by(
+        'pk').values_list('pk', 'image', 'group_id', 'author_id')
+    for pk, name, group_id, author_id in posts:
+        try:
+            source = _source(name)
+            # Без --force готовые картинки пропускаются, поэтому
+            # прерванный запуск можно просто повторить.
+            if not force and all(thumbnails.get_cached(source, size)
+                                 for size in thumbnails.SIZES):
+                results.append((pk, False, None))
+                continue
+            if force:
+                default.kvstore.delete_thumbnails(source)
+            thumbnails.generate(source)
+        except Exception as error:
+            results.append((pk, False, f'{type(error).__name__}: {error}'))
+            continue
+        results.append((pk, True, None))
+        scopes.update((
+            caching.group_scope(group_id),
+            caching.profile_scope(author_id),
+            caching.post_scope(pk),
+        ))
+    if scopes:
+        caching.bump(caching.INDEX, *scopes)
+    return results
+
+
+class Command(BaseCommand):
+    help = ('Готовит миниатюры стандартных размеров для картинок всех '
+            'постов в нескольких процессах')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=cpu_count(),
+            help='Число процессов; 0 - без пула, в текущем процессе.',
+        )
+        parser.add_argument(
+            '--after', type=int, default=0, metavar='ID',
+            help='Продолжить с постов, id которых больше ID.',
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Удалить и заново подготовить уже готовые миниатюры.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=20,
+            help='Сколько id постов процесс получает за раз.',
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').filter(
+            pk__gt=options['after']).order_by('pk')
+        total = posts.count()
+        self.stdout.write(f'Постов с картинками: {total}')
+        if not total:
+            return
+        ids = posts.values_list('pk', flat=True).iterator()
+        started = time.monotonic()
+        done = generated = failed = 0
+        for results in self._run(ids, options):
+            for pk, ready, error in results:
+                done += 1
+                generated += ready
+                if error:
+                    failed += 1
+                    self.stderr.write(f'Пост {pk}: {error}')
+                if done % 100 == 0 or done == total:
+                    elapsed = max(time.monotonic() - started, 1e-6)
+                    self.stdout.write(
+                        f'{done}/{total}, {done / elapsed:.1f} постов/с, '
+                        f'последний id {pk}'
+                    )
+        self.stdout.write(self.style.SUCCESS(
+            f'Миниатюры готовы: подготовлено {generated}, '
+            f'пропущено {done - generated - failed}, ошибок {failed}'))
+
+    def _run(self, ids, options):
+        size, force = options['chunk_size'], options['force']
+        if options['processes'] < 1:
+            for chunk in _chunks(ids, size):
+                yield _generate((chunk, force))
+            return
+        # Дочерние процессы не должны делить соединения с родителем.
+        connections.close_all()
+        tasks = ((chunk, force) for chunk in _stream(ids, size))
+        with Pool(options['processes'], initializer=_init_worker) as pool:
+            # imap сохраняет порядок, поэтому все посты до выведенного
+            # id уже обработаны и с него можно продолжить (--after).
+            yield from pool.imap(_generate, tasks)
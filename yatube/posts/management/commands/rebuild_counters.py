@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters, feed_counts
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счетчики постов, комментариев и подписок '
+            'и сбрасывает число постов в лентах')
+
+    def handle(self, *args, **options):
+        counters.rebuild()
+        feed_counts.forget_all()
+        self.stdout.write(self.style.SUCCESS('Счетчики пересчитаны'))
@@ -0,0 +1,63 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count(queryset, field):
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(count=Count('pk'))
+        .values('count')
+    ), 0)
+
+
+def fill_counters(apps, schema_editor):
+    alias = schema_editor.connection.alias
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    UserCounters = apps.get_model('posts', 'UserCounters')
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    UserCounters.objects.using(alias).bulk_create(
+        UserCounters(user_id=pk)
+        for pk in User.objects.using(alias).values_list('pk', flat=True)
+    )
+    UserCounters.objects.using(alias).update(
+        posts_count=count(Post.objects.using(alias), 'author'),
+        followers_count=count(Follow.objects.using(alias), 'author'),
+        following_count=count(Follow.objects.using(alias), 'user'),
+    )
+    Post.objects.using(alias).update(
+        comments_count=count(Comment.objects.using(alias), 'post'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0006_timelineentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserCounters',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counters', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='The user the counters belong to')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Number of posts of the user')),
+                ('followers_count', models.PositiveIntegerField(default=0, verbose_name='Number of followers of the user')),
+                ('following_count', models.PositiveIntegerField(default=0, verbose_name='Number of authors the user follows')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Number of comments of the post'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
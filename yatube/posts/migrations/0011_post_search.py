@@ -0,0 +1,46 @@
+from django.db import migrations
+
+# Полнотекстовый индекс постов (см. posts.search). Есть только в SQLite,
+# собранном с FTS5.
+CREATE_SQL = (
+    'CREATE VIRTUAL TABLE posts_post_search USING fts5('
+    "text, group_title, tokenize = 'unicode61 remove_diacritics 2')"
+)
+FILL_SQL = (
+    'INSERT INTO posts_post_search (rowid, text, group_title) '
+    "SELECT p.id, replace(replace(p.text, 'ё', 'е'), 'Ё', 'Е'), "
+    "replace(replace(coalesce(g.title, ''), 'ё', 'е'), 'Ё', 'Е') "
+    'FROM posts_post p LEFT JOIN posts_group g ON g.id = p.group_id'
+)
+
+
+def has_fts5(connection):
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+
+
+def create_search_index(apps, schema_editor):
+    if not has_fts5(schema_editor.connection):
+        return
+    schema_editor.execute(CREATE_SQL)
+    schema_editor.execute(FILL_SQL)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS posts_post_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Существующие комментарии - корни веток, их путь - собственный id,
+# а веток у поста столько же, сколько комментариев.
+PATH_STEP = 10
+BATCH_SIZE = 1000
+
+
+def fill_paths(apps, schema_editor):
+    Comment = apps.get_model('posts', 'Comment')
+    comments = Comment.objects.using(schema_editor.connection.alias)
+    batch = []
+    for comment in comments.only('pk').order_by('pk').iterator():
+        comment.path = f'{comment.pk:0{PATH_STEP}d}'
+        batch.append(comment)
+        if len(batch) == BATCH_SIZE:
+            comments.bulk_update(batch, ['path'])
+            batch = []
+    comments.bulk_update(batch, ['path'])
+    Post = apps.get_model('posts', 'Post')
+    Post.objects.using(schema_editor.connection.alias).update(
+        threads_count=models.F('comments_count'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_comment_cursor_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='comment',
+            name='comment_post_created_idx',
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Nesting level of the comment'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='posts.Comment', verbose_name='The comment this one replies to'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(default='', editable=False, max_length=210, verbose_name='Materialized path of the comment in its thread'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='threads_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Number of top-level comments of the post'),
+        ),
+        migrations.RunPython(fill_paths, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'depth', '-created', '-id'], name='comment_post_roots_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'path'], name='comment_post_path_idx'),
+        ),
+    ]
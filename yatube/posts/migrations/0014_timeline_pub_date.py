@@ -0,0 +1,46 @@
+# Generated by Django 2.2.16 on 2026-10-18 09:10
+
+from django.conf import settings
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def fill_timeline(apps, schema_editor):
+    '''Даты постов в ленты, флаг популярности - по числу подписчиков.'''
+    alias = schema_editor.connection.alias
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    TimelineEntry.objects.using(alias).update(pub_date=models.Subquery(
+        Post.objects.using(alias).filter(
+            pk=models.OuterRef('post_id')).values('pub_date')[:1]
+    ))
+    UserCounters = apps.get_model('posts', 'UserCounters')
+    UserCounters.objects.using(alias).filter(
+        followers_count__gt=settings.FOLLOW_FEED_FANOUT_LIMIT,
+    ).update(popular=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_comment_threads'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timelineentry',
+            name='pub_date',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Publication date of the post'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='usercounters',
+            name='popular',
+            field=models.BooleanField(default=False, verbose_name='Posts are read on demand, not pushed to timelines'),
+        ),
+        migrations.RunPython(fill_timeline, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', '-pub_date', '-post'], name='timeline_feed_idx'),
+        ),
+    ]
@@ -1,5 +1,8 @@
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Coalesce
+
+from .storage import image_storage
 
 User = get_user_model()
 
@@ -13,12 +16,37 @@ class Group(models.Model):
         return self.title
 
 
+# Поля, которые не выводятся в карточках постов в лентах.
+FEED_DEFERRED_FIELDS = (
+    'author__password',
+    'author__last_login',
+    'author__is_superuser',
+    'author__email',
+    'author__is_staff',
+    'author__is_active',
+    'author__date_joined',
+    'group__description',
+)
+
+
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Посты для лент: автор и группа загружаются одним запросом."""
+        return self.select_related('author', 'group').defer(
+            *FEED_DEFERRED_FIELDS
+        )
+
+
 class Post(models.Model):
     text = models.TextField(verbose_name="Text of the post")
     pub_date = models.DateTimeField(
         auto_now_add=True,
         verbose_name="Publication data of the post",
     )
+    updated = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Last modification date of the post",
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -28,6 +56,7 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=image_storage,
         blank=True,
     )
     group = models.ForeignKey(
@@ -38,9 +67,31 @@ class Post(models.Model):
         null=True,
         verbose_name="The group the post belongs to",
     )
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Number of comments of the post",
+    )
+    threads_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Number of top-level comments of the post",
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ['-pub_date']
+        # Под сортировку лент (posts.paginators): общая лента, группа
+        # и профиль автора.
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_feed_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_feed_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_feed_idx'),
+        ]
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
 
@@ -48,6 +99,67 @@ class Post(models.Model):
         return self.text[:15]
 
 
+# Путь комментария - id всех его предков и его собственный, каждый
+# по COMMENT_PATH_STEP цифр. Ветка лежит в индексе (post, path) подряд,
+# в порядке обхода дерева, и читается одним запросом по диапазону.
+COMMENT_PATH_STEP = 10
+# Ответы глубже становятся ответами на родителя: path не длиннее
+# (COMMENT_MAX_DEPTH + 1) * COMMENT_PATH_STEP символов.
+COMMENT_MAX_DEPTH = 20
+# Сколько комментариев ветки выводится сразу, остальные - по ссылке.
+COMMENT_THREAD_PREVIEW = 10
+
+
+class CommentQuerySet(models.QuerySet):
+    def threads(self, roots, limit=COMMENT_THREAD_PREVIEW):
+        """Начала веток корневых комментариев roots в их порядке.
+
+        Из каждой ветки одним запросом берется не больше limit
+        комментариев в порядке обхода: большая ветка не раздувает
+        страницу. Продолжение обрезанной ветки отдает replies_after.
+        """
+        roots = list(roots)
+        if not roots:
+            return []
+        # Ветка - диапазон path от корня до корня + ';' (';' следует
+        # за цифрами). Диапазон обрезается по path комментария, идущего
+        # через limit + 1 от корня: его находит подзапрос по индексу
+        # (post, path) с OFFSET, сколько бы ответов в ветке ни было.
+        condition = models.Q()
+        for root in roots:
+            end = root.path + ';'
+            boundary = self.model.objects.filter(
+                post_id=root.post_id, path__gte=root.path, path__lt=end,
+            ).order_by('path').values('path')[limit + 1:limit + 2]
+            condition |= models.Q(
+                path__gte=root.path,
+                path__lt=Coalesce(models.Subquery(boundary),
+                                  models.Value(end)),
+            )
+        threads = {root.path: [] for root in roots}
+        for comment in self.filter(condition).order_by('path'):
+            thread = threads.get(comment.path[:COMMENT_PATH_STEP])
+            if thread is not None:
+                thread.append(comment)
+        return [comment for thread in threads.values()
+                for comment in _preview(thread, limit)]
+
+    def replies_after(self, path, limit=COMMENT_THREAD_PREVIEW):
+        """Следующие limit комментариев ветки после комментария с path."""
+        comments = self.filter(
+            path__gt=path, path__lt=path[:COMMENT_PATH_STEP] + ';',
+        ).order_by('path')
+        return _preview(list(comments[:limit + 1]), limit)
+
+
+def _preview(comments, limit):
+    # Лишний комментарий лишь показывает, что ветка длиннее limit.
+    if len(comments) > limit:
+        comments = comments[:limit]
+        comments[-1].more_replies = True
+    return comments
+
+
 class Comment(models.Model):
     post = models.ForeignKey(
         Post,
@@ -66,15 +178,58 @@ class Comment(models.Model):
         auto_now_add=True,
         verbose_name="Publication data of the comment",
     )
+    parent = models.ForeignKey(
+        'self',
+        related_name='replies',
+        on_delete=models.CASCADE,
+        blank=True,
+        null=True,
+        verbose_name="The comment this one replies to",
+    )
+    path = models.CharField(
+        max_length=(COMMENT_MAX_DEPTH + 1) * COMMENT_PATH_STEP,
+        default='',
+        editable=False,
+        verbose_name="Materialized path of the comment in its thread",
+    )
+    depth = models.PositiveSmallIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Nesting level of the comment",
+    )
+
+    objects = CommentQuerySet.as_manager()
 
     class Meta:
         ordering = ['-created']
+        indexes = [
+            # Корневые комментарии поста страницами (posts.paginators).
+            models.Index(fields=['post', 'depth', '-created', '-id'],
+                         name='comment_post_roots_idx'),
+            models.Index(fields=['post', 'path'],
+                         name='comment_post_path_idx'),
+        ]
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
 
     def __str__(self):
         return self.text
 
+    def save(self, *args, **kwargs):
+        if not self.pk and self.parent_id:
+            if self.parent.depth >= COMMENT_MAX_DEPTH:
+                self.parent = self.parent.parent
+            self.depth = self.parent.depth + 1
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+            if not self.path:
+                # Последний шаг пути - собственный id, он известен
+                # только после вставки.
+                parent_path = self.parent.path if self.parent_id else ''
+                self.path = (
+                    f'{parent_path}{self.pk:0{COMMENT_PATH_STEP}d}')
+                Comment.objects.filter(pk=self.pk).update(path=self.path)
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -100,3 +255,74 @@ class Follow(models.Model):
                 name='unique follow'
             ),
         ]
+
+
+class TimelineEntry(models.Model):
+    """Пост в материализованной ленте подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        related_name='timeline',
+        on_delete=models.CASCADE,
+        verbose_name="The owner of the timeline",
+    )
+    post = models.ForeignKey(
+        Post,
+        related_name='timeline_entries',
+        on_delete=models.CASCADE,
+        verbose_name="The post in the timeline",
+    )
+    # Копия post.pub_date: лента листается по индексу timeline_feed_idx
+    # без обращения к posts_post и без сортировки.
+    pub_date = models.DateTimeField(
+        verbose_name="Publication date of the post",
+    )
+
+    def __str__(self):
+        return f'{self.post} в ленте {self.user}'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique timeline entry'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_feed_idx',
+            ),
+        ]
+
+
+class UserCounters(models.Model):
+    """Денормализованные счетчики пользователя."""
+    user = models.OneToOneField(
+        User,
+        primary_key=True,
+        related_name='counters',
+        on_delete=models.CASCADE,
+        verbose_name="The user the counters belong to",
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Number of posts of the user",
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Number of followers of the user",
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Number of authors the user follows",
+    )
+    # Однажды ставший популярным автор остается им: его посты
+    # не раскладываются по лентам и всегда читаются при просмотре,
+    # поэтому не пропадают, если подписчиков снова станет меньше.
+    popular = models.BooleanField(
+        default=False,
+        verbose_name="Posts are read on demand, not pushed to timelines",
+    )
+
+    def __str__(self):
+        return f'Счетчики {self.user}'
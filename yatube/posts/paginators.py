@@ -0,0 +1,168 @@
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+NEXT = 'n'
+PREVIOUS = 'p'
+LAST = 'l'
+
+ELLIPSIS = '…'
+
+# Целые в курсоре должны помещаться в INTEGER SQLite.
+MAX_CURSOR_INT = 2 ** 63 - 1
+
+
+def _bounded_int(value):
+    # bool - тоже int, а 1e400 в JSON - бесконечность, а не число.
+    if (type(value) is not int
+            or not -MAX_CURSOR_INT <= value <= MAX_CURSOR_INT):
+        raise ValueError('Некорректное число в курсоре')
+    return value
+
+
+def elided_page_range(number, num_pages, on_each_side=3, on_ends=2):
+    '''Номера страниц для навигации: края и окно вокруг текущей.
+
+    Пропущенные номера заменяются на ELLIPSIS, поэтому длина списка
+    не зависит от числа страниц: 2 * (on_each_side + on_ends) + 3.
+    '''
+    if num_pages <= (on_each_side + on_ends) * 2:
+        return list(range(1, num_pages + 1))
+    pages = []
+    if number > 1 + on_each_side + on_ends + 1:
+        pages += list(range(1, on_ends + 1)) + [ELLIPSIS]
+        pages += list(range(number - on_each_side, number + 1))
+    else:
+        pages += list(range(1, number + 1))
+    if number < num_pages - on_each_side - on_ends - 1:
+        pages += list(range(number + 1, number + on_each_side + 1))
+        pages += [ELLIPSIS]
+        pages += list(range(num_pages - on_ends + 1, num_pages + 1))
+    else:
+        pages += list(range(number + 1, num_pages + 1))
+    return pages
+
+
+class CursorPaginator(Paginator):
+    '''Паджинатор ленты с переходом по курсору (keyset).
+
+    Соседние страницы выбираются условием по паре (поле сортировки, pk)
+    вместо OFFSET, поэтому переход на следующую страницу стоит одинаково
+    на первой и на пятитысячной странице. Номерные страницы (?page=N)
+    по-прежнему работают через OFFSET.
+    '''
+
+    ELLIPSIS = ELLIPSIS
+
+    def __init__(self, object_list, per_page, ordering=('-pub_date', '-pk'),
+                 count=None, **kwargs):
+        field, tie_breaker = ordering
+        self.descending = field.startswith('-')
+        self.key_field = field.lstrip('-')
+        super().__init__(object_list.order_by(field, tie_breaker),
+                         per_page, **kwargs)
+        if count is not None:
+            # Заранее известное число объектов избавляет от COUNT(*).
+            self.count = count
+
+    def get_cursor_page(self, cursor):
+        '''Вернуть страницу по курсору; битый курсор ведёт на первую.'''
+        try:
+            direction, number, key = self.decode_cursor(cursor)
+            if direction == LAST:
+                return self._last_page()
+            if direction == NEXT:
+                object_list = list(self._seek(key, forward=True))
+                if not object_list:
+                    return self._last_page()
+                return self._get_page(object_list, number, self)
+            object_list = list(self._seek(key, forward=False))[::-1]
+        except (TypeError, ValueError, OverflowError):
+            # OverflowError - число вне 64-битного диапазона SQLite.
+            return self.get_page(None)
+        if len(object_list) < self.per_page:
+            return self.get_page(1)
+        return self._get_page(object_list, number, self)
+
+    def _seek(self, key, forward):
+        '''Выбрать страницу строго после (или до) ключа key.'''
+        value, pk = key
+        after = forward == self.descending
+        lookup = 'lt' if after else 'gt'
+        keyset = (
+            Q(**{f'{self.key_field}__{lookup}e': value})
+            & (Q(**{f'{self.key_field}__{lookup}': value})
+               | Q(**{f'pk__{lookup}': pk}))
+        )
+        object_list = self.object_list.filter(keyset)
+        if not forward:
+            object_list = object_list.reverse()
+        return object_list[:self.per_page]
+
+    def _last_page(self):
+        '''Последняя страница: обратный порядок без OFFSET.'''
+        number = self.num_pages
+        size = self.count - (number - 1) * self.per_page
+        object_list = list(self.object_list.reverse()[:size])[::-1]
+        return self._get_page(object_list, number, self)
+
+    def _get_page(self, *args, **kwargs):
+        page = super()._get_page(*args, **kwargs)
+        page.object_list = list(page.object_list)
+        page.elided_page_range = elided_page_range(
+            page.number, self.num_pages)
+        page.next_cursor = page.previous_cursor = page.last_cursor = None
+        if page.object_list and page.has_next():
+            page.next_cursor = self.encode_cursor(
+                NEXT, page.number + 1, page.object_list[-1])
+            page.last_cursor = self.encode_cursor(LAST, self.num_pages)
+        if page.object_list and page.has_previous():
+            page.previous_cursor = self.encode_cursor(
+                PREVIOUS, page.number - 1, page.object_list[0])
+        return page
+
+    def _key_model_field(self):
+        annotation = self.object_list.query.annotations.get(self.key_field)
+        if annotation is None:
+            return self.object_list.model._meta.get_field(self.key_field)
+        # Ключ по аннотации, например по релевантности поиска.
+        field = annotation.output_field.clone()
+        field.set_attributes_from_name(self.key_field)
+        return field
+
+    def encode_cursor(self, direction, number, obj=None):
+        key = None
+        if obj is not None:
+            key = (self._key_model_field().value_to_string(obj), obj.pk)
+        data = json.dumps([direction, number, key], separators=(',', ':'))
+        return urlsafe_base64_encode(data.encode())
+
+    def decode_cursor(self, cursor):
+        direction, number, key = json.loads(urlsafe_base64_decode(cursor))
+        if direction not in (NEXT, PREVIOUS, LAST):
+            raise ValueError('Неизвестное направление курсора')
+        number = _bounded_int(number)
+        if number < 1:
+            raise ValueError('Некорректный номер страницы в курсоре')
+        if direction == LAST:
+            return direction, number, None
+        value, pk = key
+        try:
+            value = self._key_model_field().to_python(value)
+        except ValidationError:
+            raise ValueError('Некорректный ключ курсора')
+        if isinstance(value, int):
+            value = _bounded_int(value)
+        return direction, number, (value, _bounded_int(pk))
+
+
+def paginate(request, object_list, per_page, **kwargs):
+    '''Страница ленты по параметру ?cursor= или ?page= запроса.'''
+    paginator = CursorPaginator(object_list, per_page, **kwargs)
+    cursor = request.GET.get('cursor')
+    if cursor:
+        return paginator.get_cursor_page(cursor)
+    return paginator.get_page(request.GET.get('page'))
@@ -0,0 +1,171 @@
+"""Полнотекстовый поиск постов.
+
+Текст поста и название его группы лежат в FTS5-таблице posts_post_search
+(rowid - id поста), поэтому поиск идет по обратному индексу, а не
+LIKE '%...%' по всей posts_post. Таблицу создает миграция 0011, в актуальном
+состоянии ее держат сигналы сохранения и удаления постов и групп.
+Массовые операции сигналов не посылают - после них индекс пересобирает
+rebuild_search_index.
+
+Морфологии у FTS5 нет, поэтому каждое слово запроса ищется как префикс:
+"пост" найдет и "посты", и "постов". Результаты упорядочены по
+релевантности (bm25). Если SQLite собран без FTS5 (или база не SQLite),
+таблицы индекса нет и поиск работает через LIKE.
+"""
+import re
+
+from django.db import connections
+from django.db.models import ExpressionWrapper, F, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+from .models import Post
+
+TABLE = 'posts_post_search'
+# Больше слов в запросе не нужно, а длинные запросы дороги.
+MAX_TERMS = 10
+
+_WORD_RE = re.compile(r'\w+')
+
+# Есть ли FTS5, по псевдонимам баз: сборка SQLite за время работы
+# процесса не меняется.
+_fts5 = {}
+
+
+def _has_fts5(connection):
+    '''Собран ли SQLite соединения с FTS5.'''
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+
+
+def is_available(using='default'):
+    if using not in _fts5:
+        _fts5[using] = _has_fts5(connections[using])
+    return _fts5[using]
+
+
+def _normalize(text):
+    # unicode61 не считает "ё" буквой "е" с диакритикой.
+    return text.replace('ё', 'е').replace('Ё', 'Е')
+
+
+def _sql_normalize(expression):
+    return f"replace(replace({expression}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+def terms(query):
+    '''Слова поискового запроса без повторов.'''
+    words = _WORD_RE.findall(_normalize(query).lower())
+    return list(dict.fromkeys(words))[:MAX_TERMS]
+
+
+def match_expression(words):
+    '''Выражение MATCH: все слова как префиксы, без синтаксиса FTS5.'''
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def index_post(post, using='default'):
+    if not is_available(using):
+        return
+    group_title = post.group.title if post.group_id else ''
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [post.pk])
+        cursor.execute(
+            f'INSERT INTO {TABLE} (rowid, text, group_title) '
+            'VALUES (%s, %s, %s)',
+            [post.pk, _normalize(post.text), _normalize(group_title)],
+        )
+
+
+def unindex_post(post_id, using='default'):
+    if not is_available(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [post_id])
+
+
+def reindex_group(group, using='default', title=None):
+    '''Обновить название группы у всех ее постов.'''
+    if title is None:
+        title = group.title
+    if not is_available(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {TABLE} SET group_title = %s WHERE rowid IN '
+            '(SELECT id FROM posts_post WHERE group_id = %s)',
+            [_normalize(title), group.pk],
+        )
+
+
+def rebuild(using='default'):
+    '''Собрать индекс заново по всем постам; вернуть их число.'''
+    if not is_available(using):
+        return 0
+    text = _sql_normalize('p.text')
+    group_title = _sql_normalize("coalesce(g.title, '')")
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+        cursor.execute(
+            f'INSERT INTO {TABLE} (rowid, text, group_title) '
+            f'SELECT p.id, {text}, {group_title} '
+            'FROM posts_post p LEFT JOIN posts_group g ON g.id = p.group_id'
+        )
+        cursor.execute(f'SELECT count(*) FROM {TABLE}')
+        return cursor.fetchone()[0]
+
+
+def matching(posts, words):
+    '''Посты из posts, в которых есть все слова words.'''
+    # Не pk__in=RawSQL(...): SQLite прочитал бы "IN ((SELECT ...))"
+    # как список из одного значения.
+    return posts.extra(
+        where=[f'posts_post.id IN '
+               f'(SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s)'],
+        params=[match_expression(words)],
+    )
+
+
+def containing(posts, words):
+    '''Посты со всеми словами words через LIKE, без индекса.'''
+    condition = Q()
+    for word in words:
+        condition &= (Q(text__icontains=word)
+                      | Q(group__title__icontains=word))
+    # Без релевантности - сначала новые посты.
+    return posts.filter(condition).annotate(
+        rank=ExpressionWrapper(-F('pk'), output_field=FloatField()))
+
+
+def search_posts(query):
+    '''Посты по запросу и их число.
+
+    Посты отсортированы по убыванию релевантности: аннотация ``rank``
+    (bm25, меньше - лучше) подходит ключом для CursorPaginator.
+    '''
+    words = terms(query)
+    posts = Post.objects.for_feed()
+    # Поиск читает из той же базы, что и лента (см. core.replicas).
+    using = posts.db
+    posts = posts.using(using)
+    if not words or not is_available(using):
+        posts = containing(posts, words)
+        if not words:
+            return posts.none(), 0
+        return posts, posts.count()
+    match = match_expression(words)
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f'SELECT count(*) FROM {TABLE} WHERE {TABLE} MATCH %s', [match])
+        count = cursor.fetchone()[0]
+    # Посты соединяются с таблицей индекса по rowid: MATCH выполняется
+    # один раз, а rank берется из той же строки индекса, без
+    # подзапроса на каждый найденный пост.
+    posts = posts.extra(
+        tables=[TABLE],
+        where=[f'{TABLE}.rowid = posts_post.id', f'{TABLE} MATCH %s'],
+        params=[match],
+    ).annotate(rank=RawSQL(f'{TABLE}.rank', [], output_field=FloatField()))
+    return posts, count
@@ -0,0 +1,165 @@
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from . import caching, counters, feed_counts, search, timeline
+from .models import Comment, Follow, Group, Post, User, UserCounters
+
+
+@receiver(post_save, sender=User)
+def create_user_counters(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserCounters.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def count_new_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_user_counter(instance.author_id, 'posts_count', 1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.change_user_counter(instance.author_id, 'posts_count', -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_comments_counter(
+            instance.post_id, 1, thread=not instance.parent_id)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.change_comments_counter(
+        instance.post_id, -1, thread=not instance.parent_id)
+
+
+@receiver(post_save, sender=Follow)
+def count_new_follow(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_user_counter(
+            instance.author_id, 'followers_count', 1)
+        counters.change_user_counter(
+            instance.user_id, 'following_count', 1)
+        timeline.mark_popular(instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    counters.change_user_counter(instance.author_id, 'followers_count', -1)
+    counters.change_user_counter(instance.user_id, 'following_count', -1)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_new_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and timeline.is_push_mode():
+        timeline.fan_out_post(instance)
+
+
+@receiver(post_save, sender=Follow)
+def add_author_to_timeline(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and timeline.is_push_mode():
+        timeline.add_author(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def remove_author_from_timeline(sender, instance, **kwargs):
+    if timeline.is_push_mode():
+        timeline.remove_author(instance.user_id, instance.author_id)
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_group(sender, instance, raw=False, **kwargs):
+    instance._previous_group_id = None
+    if instance.pk and not raw:
+        instance._previous_group_id = Post.objects.filter(
+            pk=instance.pk).values_list('group_id', flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_pages(sender, instance, **kwargs):
+    caching.bump(
+        caching.INDEX,
+        caching.group_scope(instance.group_id),
+        caching.group_scope(getattr(instance, '_previous_group_id', None)),
+        caching.profile_scope(instance.author_id),
+        caching.post_scope(instance.pk),
+    )
+
+
+@receiver(post_save, sender=Post)
+def count_feed_post(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        feed_counts.change(caching.INDEX, 1)
+        if timeline.is_push_mode():
+            feed_counts.forget_followers_counts(instance.author_id)
+    else:
+        previous = instance._previous_group_id
+        if previous == instance.group_id:
+            return
+        if previous is not None:
+            feed_counts.change(caching.group_scope(previous), -1)
+    if instance.group_id is not None:
+        feed_counts.change(caching.group_scope(instance.group_id), 1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_feed_post(sender, instance, **kwargs):
+    feed_counts.change(caching.INDEX, -1)
+    if instance.group_id is not None:
+        feed_counts.change(caching.group_scope(instance.group_id), -1)
+    if timeline.is_push_mode():
+        feed_counts.forget_followers_counts(instance.author_id)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def forget_follow_count(sender, instance, **kwargs):
+    feed_counts.forget_follow_counts([instance.user_id])
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_pages(sender, instance, **kwargs):
+    caching.bump(caching.post_scope(instance.post_id))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_pages(sender, instance, **kwargs):
+    caching.bump(caching.GROUPS, caching.group_scope(instance.pk))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_pages(sender, instance, **kwargs):
+    caching.bump(caching.follow_scope(instance.user_id))
+
+
+@receiver(post_save, sender=Post)
+def index_post_text(sender, instance, raw=False, using='default', **kwargs):
+    if not raw:
+        search.index_post(instance, using)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post_text(sender, instance, using='default', **kwargs):
+    search.unindex_post(instance.pk, using)
+
+
+@receiver(post_save, sender=Group)
+def index_group_title(sender, instance, created, raw=False, using='default',
+                      **kwargs):
+    if not created and not raw:
+        search.reindex_group(instance, using)
+
+
+@receiver(pre_delete, sender=Group)
+def unindex_group_title(sender, instance, using='default', **kwargs):
+    # После удаления группы у ее постов уже не будет group_id.
+    search.reindex_group(instance, using, title='')
@@ -0,0 +1,55 @@
+"""Хранилище картинок постов с адресацией по содержимому.
+
+Имя файла - sha256 его содержимого: одинаковая картинка хранится один
+раз, у всех постов с ней общие миниатюры sorl (их имена зависят от
+имени исходного файла), а файл по адресу никогда не меняется, поэтому
+его можно отдавать с заголовками бессрочного кеширования.
+"""
+import hashlib
+import os
+import uuid
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def get_content_name(self, name, content):
+        '''posts/ab/abcd....gif для файла name с содержимым content.'''
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(
+            os.path.dirname(name), digest[:2], digest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.get_content_name(name, content)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length)
+
+    def get_available_name(self, name, max_length=None):
+        '''Имя по хешу уже свободно: файл с ним - та же картинка.'''
+        return name
+
+    def _save(self, name, content):
+        '''Файл пишется под временным именем и переименовывается в name.
+
+        Одновременные загрузки одной картинки обе проходят проверку
+        exists; rename заменяет файл атомарно, и обе получают имя по
+        хешу, а не name с суффиксом.
+        '''
+        directory = os.path.dirname(name)
+        temporary = super()._save(
+            os.path.join(directory, f'.{uuid.uuid4().hex}.tmp'), content)
+        os.replace(self.path(temporary), self.path(name))
+        return name.replace('\\', '/')
+
+
+image_storage = ContentAddressedStorage()
@@ -0,0 +1,26 @@
+from django import template
+from django.utils.html import format_html
+
+from posts import thumbnails
+
+register = template.Library()
+
+# Ширина картинки в ленте: на всю ширину контейнера bootstrap.
+FEED_SIZES = '(min-width: 1200px) 1110px, 100vw'
+
+
+@register.simple_tag
+def post_image(image, size='card', sizes=FEED_SIZES):
+    '''Тег img с готовой миниатюрой и srcset из вариантов по ширине.
+
+    Пока миниатюры не готовы, выводится исходный файл.
+    '''
+    if not image:
+        return ''
+    src, srcset = thumbnails.get_image(image, size)
+    if not srcset:
+        return format_html('<img class="card-img my-2" src="{}">', src)
+    return format_html(
+        '<img class="card-img my-2" src="{}" srcset="{}" sizes="{}">',
+        src, srcset, sizes,
+    )
@@ -0,0 +1,94 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Group, Post, User
+
+CHANGELIST_URL = reverse('admin:posts_post_changelist')
+
+
+class PostAdminTests(TestCase):
+    """Тестирование списка постов в админке"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            username='PostAdmin', email='admin@example.com', password='x')
+        cls.author = User.objects.create_user(username='AdminAuthor')
+        cls.groups = [
+            Group.objects.create(title=f'Группа {i}', slug=f'admin-{i}')
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def create_posts(self, number):
+        for i in range(number):
+            Post.objects.create(text=f'Пост {i}', author=self.author,
+                                group=self.groups[i % len(self.groups)])
+
+    def changelist_queries(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(CHANGELIST_URL, params)
+        self.assertEqual(response.status_code, 200)
+        return response, [query['sql'] for query in queries]
+
+    def test_query_count_does_not_depend_on_rows(self):
+        """Число запросов списка не растет с числом строк: авторы
+        и группы приходят JOIN, список групп общий для всех строк."""
+        self.create_posts(3)
+        self.changelist_queries()
+        _, few = self.changelist_queries()
+        self.create_posts(20)
+        _, many = self.changelist_queries()
+        self.assertEqual(len(few), len(many))
+        self.assertFalse(
+            [sql for sql in many if sql.startswith('SELECT "posts_group"')])
+        # Навигация по датам не сканирует всю таблицу.
+        self.assertFalse([
+            sql for sql in many
+            if 'MIN("posts_post"."pub_date")' in sql or 'DISTINCT' in sql
+        ])
+
+    def test_group_choices_follow_group_changes(self):
+        """Новая группа сразу появляется в списке выбора."""
+        self.create_posts(1)
+        self.changelist_queries()
+        Group.objects.create(title='Новая группа', slug='admin-new')
+        response, _ = self.changelist_queries()
+        self.assertContains(response, 'Новая группа')
+
+    @override_settings(ADMIN_ESTIMATED_COUNT_MIN=1)
+    def test_unfiltered_list_uses_estimated_count(self):
+        """Без фильтров число постов берется из статистики ANALYZE."""
+        self.create_posts(5)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.create_posts(2)
+        response, queries = self.changelist_queries()
+        self.assertEqual(response.context['cl'].result_count, 5)
+        self.assertFalse([sql for sql in queries if 'COUNT(' in sql])
+        year = Post.objects.first().pub_date.year
+        response, _ = self.changelist_queries(pub_date__year=year)
+        self.assertEqual(response.context['cl'].result_count, 7)
+
+    def test_small_table_is_counted_exactly(self):
+        """Для небольшой таблицы число строк точное."""
+        self.create_posts(5)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.create_posts(2)
+        response, _ = self.changelist_queries()
+        self.assertEqual(response.context['cl'].result_count, 7)
+
+    def test_search_uses_full_text_index(self):
+        """Поиск в админке идет по полнотекстовому индексу."""
+        post = Post.objects.create(text='Редкое слово', author=self.author)
+        self.create_posts(3)
+        response, queries = self.changelist_queries(q='редк')
+        self.assertEqual(list(response.context['cl'].result_list), [post])
+        self.assertFalse([sql for sql in queries if 'LIKE' in sql])
@@ -0,0 +1,145 @@
+import hashlib
+
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import caching
+from posts.models import Comment, Follow, Group, Post, User
+
+
+class VersionTests(TestCase):
+    """Тестирование версий областей кеша"""
+    def setUp(self):
+        cache.clear()
+
+    def test_bump_changes_only_its_scope(self):
+        """bump меняет версию только указанной области."""
+        index, group = caching.get_versions(
+            caching.INDEX, caching.group_scope(1))
+        caching.bump(caching.INDEX)
+        new_index, new_group = caching.get_versions(
+            caching.INDEX, caching.group_scope(1))
+        self.assertNotEqual(index, new_index)
+        self.assertEqual(group, new_group)
+
+    def test_evicted_version_does_not_repeat(self):
+        """Версия, вытесненная из кеша, не повторяется."""
+        version, = caching.get_versions(caching.INDEX)
+        caching.bump(caching.INDEX)
+        cache.clear()
+        new_version, = caching.get_versions(caching.INDEX)
+        self.assertNotIn(new_version, (version, version + 1))
+
+
+class InvalidationTests(TestCase):
+    """Кешированные фрагменты сбрасываются при изменении данных"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='CacheAuthor')
+        cls.reader = User.objects.create_user(username='CacheReader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='cache-group', description='Описание')
+        cls.post = Post.objects.create(
+            text='Первый пост', author=cls.author, group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_new_post_invalidates_feeds(self):
+        """Новый пост сразу виден на главной, в группе и в профиле."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'cache-group'}),
+            reverse('posts:profile', kwargs={'username': 'CacheAuthor'}),
+        )
+        for url in urls:
+            self.client.get(url)
+        Post.objects.create(
+            text='Свежий пост', author=self.author, group=self.group)
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), 'Свежий пост')
+
+    def test_post_edit_invalidates_detail(self):
+        """Правка поста сразу видна на странице поста."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        self.client.get(url)
+        self.author_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': self.post.pk}),
+            data={'text': 'Исправленный пост', 'group': self.group.pk},
+        )
+        self.assertContains(self.client.get(url), 'Исправленный пост')
+
+    def test_comment_invalidates_detail(self):
+        """Новый комментарий сразу виден на странице поста."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        self.client.get(url)
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Новый комментарий')
+        self.assertContains(self.client.get(url), 'Новый комментарий')
+
+    def test_group_change_invalidates_cards(self):
+        """Смена адреса группы сразу видна в карточках постов."""
+        self.client.get(reverse('posts:index'))
+        self.group.slug = 'renamed-group'
+        self.group.save()
+        self.assertContains(self.client.get(reverse('posts:index')),
+                            '/group/renamed-group/')
+
+    def test_follow_invalidates_follow_feed(self):
+        """Подписка сразу меняет ленту подписок."""
+        url = reverse('posts:follow_index')
+        self.assertNotContains(self.reader_client.get(url), 'Первый пост')
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertContains(self.reader_client.get(url), 'Первый пост')
+
+
+class StaleWhileRevalidateTests(TestCase):
+    """Тестирование кеша главной страницы для гостей"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='StaleAuthor')
+        Post.objects.create(text='Старый пост', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        caching.metrics.clear()
+
+    def test_fresh_page_is_served_from_cache(self):
+        """Повторный запрос гостя отдается из кеша."""
+        self.client.get(reverse('posts:index'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Старый пост')
+        self.assertEqual(caching.metrics['miss'], 1)
+        self.assertEqual(caching.metrics['hit'], 1)
+
+    def test_stale_page_is_served_while_locked(self):
+        """Пока страницу пересчитывает другой процесс, отдается
+        устаревшая версия; затем страница обновляется."""
+        self.client.get(reverse('posts:index'))
+        Post.objects.create(text='Новый пост', author=self.author)
+        lock_key = caching.VIEW_KEY.format(
+            'index', hashlib.md5(b'/').hexdigest()) + ':lock'
+        cache.add(lock_key, 1)
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotContains(response, 'Новый пост')
+        self.assertEqual(caching.metrics['stale'], 1)
+        cache.delete(lock_key)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Новый пост')
+
+    def test_authenticated_user_is_not_cached(self):
+        """Авторизованный пользователь всегда получает свою страницу."""
+        self.client.force_login(self.author)
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Пользователь: StaleAuthor')
+        self.assertEqual(sum(caching.metrics.values()), 0)
@@ -0,0 +1,123 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Post, User, UserCounters
+
+
+class CountersTests(TestCase):
+    """Тестирование денормализованных счетчиков"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='CounterAuthor')
+        cls.reader = User.objects.create_user(username='CounterReader')
+
+    def counters(self, user):
+        return UserCounters.objects.get(user=user)
+
+    def test_posts_counter(self):
+        """Счетчик постов меняется при создании и удалении поста."""
+        post = Post.objects.create(text='Пост', author=self.author)
+        self.assertEqual(self.counters(self.author).posts_count, 1)
+        post.delete()
+        self.assertEqual(self.counters(self.author).posts_count, 0)
+
+    def test_comments_counter(self):
+        """Счетчик комментариев меняется вместе с комментариями поста."""
+        post = Post.objects.create(text='Пост', author=self.author)
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий')
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+
+    def test_threads_counter(self):
+        """Ответы не меняют число веток комментариев поста."""
+        post = Post.objects.create(text='Пост', author=self.author)
+        root = Comment.objects.create(
+            post=post, author=self.reader, text='Корень')
+        Comment.objects.create(
+            post=post, author=self.reader, text='Ответ', parent=root)
+        post.refresh_from_db()
+        self.assertEqual((post.comments_count, post.threads_count), (2, 1))
+        root.delete()
+        post.refresh_from_db()
+        self.assertEqual((post.comments_count, post.threads_count), (0, 0))
+
+    def test_follow_counters(self):
+        """Подписка меняет счетчики подписчиков и подписок."""
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.counters(self.author).followers_count, 1)
+        self.assertEqual(self.counters(self.reader).following_count, 1)
+        follow.delete()
+        self.assertEqual(self.counters(self.author).followers_count, 0)
+        self.assertEqual(self.counters(self.reader).following_count, 0)
+
+    def test_rebuild_counters_command(self):
+        """Команда rebuild_counters пересчитывает счетчики."""
+        Post.objects.bulk_create(
+            [Post(text=f'Пост {i}', author=self.author) for i in range(3)])
+        UserCounters.objects.filter(user=self.reader).delete()
+        Follow.objects.create(user=self.reader, author=self.author)
+        call_command('rebuild_counters', stdout=StringIO())
+        self.assertEqual(self.counters(self.author).posts_count, 3)
+        self.assertEqual(self.counters(self.author).followers_count, 1)
+        self.assertEqual(self.counters(self.reader).following_count, 1)
+
+    def test_profile_and_detail_do_not_count_posts(self):
+        """Профиль и страница поста не считают посты автора запросом."""
+        post = Post.objects.create(text='Пост', author=self.author)
+        pages = (
+            reverse('posts:profile', kwargs={'username': 'CounterAuthor'}),
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}),
+        )
+        for url in pages:
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url)
+                self.assertContains(response, 'Всего постов')
+                counts = [
+                    query['sql'] for query in queries.captured_queries
+                    if 'COUNT' in query['sql']
+                ]
+                self.assertEqual(counts, [])
+
+    def test_pages_of_user_without_counters(self):
+        """Профиль и пост пользователя без строки счетчиков (bulk_create,
+        loaddata) открываются, счетчики создаются по данным таблиц."""
+        User.objects.bulk_create([User(username='BulkAuthor')])
+        user = User.objects.get(username='BulkAuthor')
+        post = Post.objects.create(text='Пост', author=user)
+        UserCounters.objects.filter(user=user).delete()
+        pages = (
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}),
+            reverse('posts:profile', kwargs={'username': 'BulkAuthor'}),
+        )
+        for url in pages:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.counters(user).posts_count, 1)
+
+    def test_signal_creates_missing_counters_from_tables(self):
+        """Сигнал для пользователя без строки счетчиков считает их
+        по таблицам, а не начинает с нуля."""
+        User.objects.bulk_create([User(username='BulkPoster')])
+        user = User.objects.get(username='BulkPoster')
+        UserCounters.objects.filter(user=user).delete()
+        Post.objects.bulk_create(
+            [Post(text=f'Пост {i}', author=user) for i in range(25)])
+        Follow.objects.bulk_create([Follow(user=self.reader, author=user)])
+        Post.objects.create(text='Новый пост', author=user)
+        counters = self.counters(user)
+        self.assertEqual(counters.posts_count, 26)
+        self.assertEqual(counters.followers_count, 1)
+        Post.objects.filter(author=user).first().delete()
+        self.assertEqual(self.counters(user).posts_count, 25)
@@ -0,0 +1,139 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.db import estimated_count
+from posts import feed_counts
+from posts.models import Follow, Group, Post, User
+from posts.timeline import follow_feed
+
+
+class FeedCountsTests(TestCase):
+    """Тестирование числа постов в лентах"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='FeedCountAuthor')
+        cls.reader = User.objects.create_user(username='FeedCountReader')
+        cls.group = Group.objects.create(title='Группа', slug='feed-count')
+        cls.other = Group.objects.create(title='Другая', slug='feed-other')
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def create_posts(self, number, group=None):
+        return [
+            Post.objects.create(
+                text=f'Пост {i}', author=self.author, group=group)
+            for i in range(number)
+        ]
+
+    def counts(self):
+        return (
+            feed_counts.index_count(Post.objects.all()),
+            feed_counts.group_count(
+                self.group.pk, Post.objects.filter(group=self.group)),
+            feed_counts.group_count(
+                self.other.pk, Post.objects.filter(group=self.other)),
+        )
+
+    def test_counts_follow_posts_without_recount(self):
+        """Сигналы поправляют кешированные числа, COUNT(*) не нужен."""
+        self.create_posts(2)
+        self.create_posts(3, self.group)
+        self.assertEqual(self.counts(), (5, 3, 0))
+        post, = self.create_posts(1, self.group)
+        post.group = self.other
+        post.save()
+        self.create_posts(1)[0].delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.counts(), (6, 3, 1))
+
+    def test_rebuild_counters_forgets_counts(self):
+        """rebuild_counters сбрасывает числа после массовых операций."""
+        self.create_posts(1, self.group)
+        self.assertEqual(self.counts(), (1, 1, 0))
+        Post.objects.bulk_create(
+            [Post(text='Пост', author=self.author, group=self.other)])
+        call_command('rebuild_counters', stdout=StringIO())
+        self.assertEqual(self.counts(), (2, 1, 1))
+
+    def test_warm_feeds_do_not_count_posts(self):
+        """Ленты с известным числом постов не выполняют COUNT(*)."""
+        self.create_posts(2, self.group)
+        Follow.objects.create(user=self.reader, author=self.author)
+        pages = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'feed-count'}),
+            reverse('posts:follow_index'),
+        )
+        for url in pages:
+            with self.subTest(url=url):
+                self.reader_client.get(url)
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.reader_client.get(url)
+                self.assertEqual(response.context['page_obj'].paginator.count,
+                                 2)
+                self.assertFalse([
+                    query['sql'] for query in queries.captured_queries
+                    if 'COUNT(' in query['sql']
+                ])
+
+    @override_settings(FEED_ESTIMATED_COUNT_MIN=1)
+    def test_large_index_uses_estimate(self):
+        """Для большой общей ленты берется оценка по статистике."""
+        self.create_posts(5)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.create_posts(2)
+        self.assertEqual(feed_counts.index_count(Post.objects.all()), 5)
+        self.create_posts(1)
+        self.assertEqual(feed_counts.index_count(Post.objects.all()), 6)
+
+    def test_analyze_db_refreshes_estimate(self):
+        """Команда analyze_db обновляет статистику для оценки."""
+        self.assertIsNone(estimated_count(Post))
+        self.create_posts(5)
+        call_command('analyze_db', stdout=StringIO())
+        self.assertEqual(estimated_count(Post), 5)
+        self.create_posts(3)
+        call_command('analyze_db', 'posts_post', stdout=StringIO())
+        self.assertEqual(estimated_count(Post), 8)
+
+    def test_estimate_is_bounded_by_ids(self):
+        """Оценка не больше размаха id, даже если статистика устарела."""
+        posts = self.create_posts(5)
+        call_command('analyze_db', stdout=StringIO())
+        for post in posts[2:]:
+            post.delete()
+        self.assertEqual(estimated_count(Post), 2)
+        Post.objects.all().delete()
+        self.assertEqual(estimated_count(Post), 0)
+
+    def test_follow_count(self):
+        """Число постов ленты подписок меняется с постами и подписками."""
+        self.create_posts(2)
+        for mode in ('pull', 'push'):
+            with self.subTest(mode=mode), override_settings(
+                    FOLLOW_FEED_MODE=mode):
+                posts, _ = follow_feed(self.reader)
+                follow = Follow.objects.create(
+                    user=self.reader, author=self.author)
+                self.assertEqual(
+                    feed_counts.follow_count(self.reader, posts), 2)
+                post, = self.create_posts(1)
+                self.assertEqual(
+                    feed_counts.follow_count(self.reader, posts), 3)
+                post.delete()
+                self.assertEqual(
+                    feed_counts.follow_count(self.reader, posts), 2)
+                follow.delete()
+                self.assertEqual(
+                    feed_counts.follow_count(self.reader, posts), 0)
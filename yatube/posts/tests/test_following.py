@@ -0,0 +1,80 @@
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import following
+from posts.models import Follow, User
+
+
+class FollowingCacheTests(TestCase):
+    """Тестирование кеша подписок пользователя"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='FollowingReader')
+        cls.authors = [
+            User.objects.create_user(username=f'FollowingAuthor{i}')
+            for i in range(5)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def reader_from_db(self):
+        return User.objects.get(pk=self.reader.pk)
+
+    def test_batched_lookup_is_one_query(self):
+        """Подписки на много авторов проверяются одним запросом."""
+        for author in self.authors[::2]:
+            Follow.objects.create(user=self.reader, author=author)
+        ids = [author.pk for author in self.authors]
+        reader = self.reader_from_db()
+        with self.assertNumQueries(1):
+            self.assertEqual(following.following_among(reader, ids),
+                             set(ids[::2]))
+            for author in self.authors:
+                following.is_following(reader, author.pk)
+        # Другой запрос того же пользователя берет подписки из кеша.
+        with self.assertNumQueries(0):
+            self.assertTrue(following.is_following(
+                User(pk=self.reader.pk), self.authors[0].pk))
+
+    def test_follow_and_unfollow_invalidate(self):
+        """Подписка и отписка сразу видны в кеше."""
+        author = self.authors[1]
+        self.assertFalse(
+            following.is_following(self.reader_from_db(), author.pk))
+        follow = Follow.objects.create(user=self.reader, author=author)
+        self.assertTrue(
+            following.is_following(self.reader_from_db(), author.pk))
+        follow.delete()
+        self.assertFalse(
+            following.is_following(self.reader_from_db(), author.pk))
+
+    def test_large_author_ids(self):
+        """id автора больше 32 бит хранится без переполнения."""
+        author = User.objects.create_user(
+            username='FollowingBigId', id=2 ** 32 + 1)
+        Follow.objects.create(user=self.reader, author=author)
+        self.assertTrue(
+            following.is_following(self.reader_from_db(), author.pk))
+        self.assertFalse(following.is_following(self.reader_from_db(), 1))
+
+    def test_anonymous_follows_nobody(self):
+        """У гостя подписок нет, запросов не нужно."""
+        with self.assertNumQueries(0):
+            self.assertFalse(
+                following.is_following(AnonymousUser(), self.authors[0].pk))
+
+    def test_profile_does_not_query_follow(self):
+        """Страница автора берет подписку из кеша."""
+        author = self.authors[2]
+        Follow.objects.create(user=self.reader, author=author)
+        url = reverse('posts:profile', kwargs={'username': author.username})
+        self.client.get(url)
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertTrue(response.context['following'])
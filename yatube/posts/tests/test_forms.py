@@ -3,6 +3,7 @@ from django.test import Client, TestCase, override_settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls import reverse
 import tempfile
+import hashlib
 import shutil
 from django.conf import settings
 
@@ -52,6 +53,8 @@ class PostCreateFormTests(TestCase):
             content=small_gif,
             content_type='image/gif'
         )
+        # Картинки хранятся под именем по хешу содержимого.
+        digest = hashlib.sha256(small_gif).hexdigest()
 
         form_data = {
             'text': 'Тестовый текст4',
@@ -72,7 +75,7 @@ class PostCreateFormTests(TestCase):
         self.assertTrue(
             Post.objects.filter(
                 text='Тестовый текст4',
-                image='posts/small.gif'
+                image=f'posts/{digest[:2]}/{digest}.gif'
             ).exists()
         )
 
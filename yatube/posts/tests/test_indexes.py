@@ -0,0 +1,72 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User
+
+
+class FeedQueryPlanTests(TestCase):
+    """Запросы лент идут по индексам, без полного обхода и сортировки"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='PlanAuthor')
+        cls.reader = User.objects.create_user(username='PlanReader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='plan-group', description='Описание')
+        cls.post = Post.objects.create(
+            text='Пост', author=cls.author, group=cls.group)
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def get_plans(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        plans = {}
+        with connection.cursor() as cursor:
+            for query in queries.captured_queries:
+                sql = query['sql']
+                # Служебные таблицы SQLite (статистика ANALYZE) малы
+                # и индексов не имеют.
+                if not sql.startswith('SELECT') or 'FROM sqlite_' in sql:
+                    continue
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                plans[sql] = [row[-1] for row in cursor.fetchall()]
+        return plans
+
+    def assert_indexed(self, url, allow_sort=False):
+        for sql, plan in self.get_plans(url).items():
+            for step in plan:
+                with self.subTest(url=url, sql=sql, step=step):
+                    # SCAN без индекса - полный обход таблицы.
+                    self.assertFalse(
+                        step.startswith('SCAN') and 'INDEX' not in step)
+                    if not allow_sort:
+                        self.assertNotIn('TEMP B-TREE', step)
+
+    def test_feed_queries_use_indexes(self):
+        """Ленты, пост и комментарии читаются по индексам."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'plan-group'}),
+            reverse('posts:profile', kwargs={'username': 'PlanAuthor'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        )
+        for url in urls:
+            self.assert_indexed(url)
+
+    def test_follow_feed_uses_indexes(self):
+        """Лента подписок читает посты авторов по индексу.
+
+        Посты нескольких авторов сливаются сортировкой, но сортируются
+        только они, а не вся таблица.
+        """
+        self.assert_indexed(reverse('posts:follow_index'), allow_sort=True)
@@ -1,5 +1,5 @@
 from django.test import TestCase
-from ..models import Group, Post, User
+from ..models import COMMENT_MAX_DEPTH, Comment, Group, Post, User
 
 
 class PostModelTest(TestCase):
@@ -27,3 +27,50 @@ class PostModelTest(TestCase):
         self.assertEqual(str(post), post.text[:15],
                          'test_models_have_correct_object_names '
                          'работает некорректно у модели Post')
+
+
+class CommentThreadTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='threads')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+
+    def comment(self, text, parent=None):
+        return Comment.objects.create(
+            post=self.post, author=self.user, text=text, parent=parent)
+
+    def test_thread_is_read_in_tree_order(self):
+        """Ветка читается одним запросом в порядке обхода."""
+        root = self.comment('корень')
+        first = self.comment('ответ 1', root)
+        self.comment('другой корень')
+        nested = self.comment('ответ 1.1', first)
+        second = self.comment('ответ 2', root)
+        with self.assertNumQueries(1):
+            self.assertEqual(Comment.objects.threads([root]),
+                             [root, first, nested, second])
+        self.assertEqual([root.depth, first.depth, nested.depth],
+                         [0, 1, 2])
+
+    def test_threads_keep_page_order(self):
+        """Ветки корней выводятся в порядке корней, без чужих веток."""
+        old = self.comment('старый')
+        middle = self.comment('средний')
+        new = self.comment('новый')
+        old_reply = self.comment('ответ старому', old)
+        middle_reply = self.comment('ответ среднему', middle)
+        self.assertEqual(Comment.objects.threads([new, old]),
+                         [new, old, old_reply])
+        self.assertEqual(Comment.objects.threads([middle]),
+                         [middle, middle_reply])
+
+    def test_depth_is_limited(self):
+        """Ответ на самый глубокий комментарий встает рядом с ним."""
+        comment = self.comment('корень')
+        for _ in range(COMMENT_MAX_DEPTH):
+            comment = self.comment('ответ', comment)
+        self.assertEqual(comment.depth, COMMENT_MAX_DEPTH)
+        reply = self.comment('еще ответ', comment)
+        self.assertEqual(reply.depth, COMMENT_MAX_DEPTH)
+        self.assertEqual(reply.parent, comment.parent)
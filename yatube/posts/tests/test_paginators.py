@@ -0,0 +1,144 @@
+from django.core.cache import cache
+from django.db import connection
+from django.template.loader import render_to_string
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.http import urlsafe_base64_encode
+
+from posts.models import Post, User
+from posts.paginators import ELLIPSIS, CursorPaginator
+from posts.views import POSTS_PER_PAGE
+
+PER_PAGE = 3
+NUMBER_OF_TEST_POSTS = POSTS_PER_PAGE + 2
+# Как у группы с 50 тысячами постов и еще на порядок больше.
+LARGE_COUNTS = (50000, 500000)
+MAX_NAVIGATION_SIZE = 5000
+
+
+class CursorPaginatorTests(TestCase):
+    """Тестирование паджинатора с курсором"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUserCursor')
+        for i in range(NUMBER_OF_TEST_POSTS):
+            Post.objects.create(text=f'Пост {i}', author=cls.user)
+
+    def setUp(self):
+        self.paginator = CursorPaginator(Post.objects.all(), PER_PAGE)
+        cache.clear()
+
+    def test_next_cursor_matches_numbered_page(self):
+        """Курсор следующей страницы отдает те же посты, что и ?page=N."""
+        page = self.paginator.get_page(1)
+        for number in range(2, self.paginator.num_pages + 1):
+            with self.subTest(number=number):
+                page = self.paginator.get_cursor_page(page.next_cursor)
+                self.assertEqual(page.number, number)
+                self.assertEqual(
+                    page.object_list,
+                    list(self.paginator.get_page(number).object_list)
+                )
+        self.assertIsNone(page.next_cursor)
+
+    def test_previous_cursor_returns_back(self):
+        """Курсор предыдущей страницы возвращает на шаг назад."""
+        third = self.paginator.get_page(3)
+        second = self.paginator.get_cursor_page(third.previous_cursor)
+        self.assertEqual(second.number, 2)
+        self.assertEqual(second.object_list,
+                         list(self.paginator.get_page(2).object_list))
+
+    def test_last_cursor(self):
+        """Курсор последней страницы отдает хвост ленты."""
+        page = self.paginator.get_page(1)
+        last = self.paginator.get_cursor_page(page.last_cursor)
+        self.assertEqual(last.number, self.paginator.num_pages)
+        self.assertEqual(
+            last.object_list,
+            list(self.paginator.get_page(self.paginator.num_pages).object_list)
+        )
+
+    def test_broken_cursor_returns_first_page(self):
+        """Битый курсор ведет на первую страницу."""
+        for cursor in ('abc', 'W10', 'WyJ4IiwxLG51bGxd'):
+            with self.subTest(cursor=cursor):
+                page = self.paginator.get_cursor_page(cursor)
+                self.assertEqual(page.number, 1)
+
+    def test_out_of_range_cursor_returns_first_page(self):
+        """Курсор с числами вне диапазона SQLite или не целыми
+        числами ведет на первую страницу, а не к ошибке сервера."""
+        post = Post.objects.first()
+        key = f'["{post.pub_date.isoformat()}",{{}}]'
+        forged = (
+            '["l",Infinity,null]',
+            '["l",1e400,null]',
+            '["n",true,' + key.format(post.pk) + ']',
+            '["n",2,' + key.format(2 ** 64) + ']',
+            '["p",2,' + key.format(-2 ** 70) + ']',
+            f'["n",{2 ** 64},' + key.format(post.pk) + ']',
+            '["p",0,' + key.format(post.pk) + ']',
+        )
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': self.user}),
+            reverse('posts:post_comments', kwargs={'post_id': post.pk}),
+        )
+        for data in forged:
+            cursor = urlsafe_base64_encode(data.encode())
+            with self.subTest(cursor=data):
+                page = self.paginator.get_cursor_page(cursor)
+                self.assertEqual(page.number, 1)
+                for url in urls:
+                    response = self.client.get(url, {'cursor': cursor})
+                    self.assertEqual(response.status_code, 200)
+
+    def test_cursor_page_does_not_use_offset(self):
+        """Переход по курсору не использует OFFSET."""
+        page = self.paginator.get_page(2)
+        with CaptureQueriesContext(connection) as queries:
+            self.paginator.get_cursor_page(page.next_cursor)
+        self.assertTrue(queries.captured_queries)
+        for query in queries.captured_queries:
+            self.assertNotIn('OFFSET', query['sql'])
+
+    def test_index_accepts_cursor(self):
+        """Главная страница принимает курсор из ссылки паджинатора."""
+        response = self.client.get(reverse('posts:index'))
+        cursor = response.context['page_obj'].next_cursor
+        response = self.client.get(reverse('posts:index'),
+                                   {'cursor': cursor})
+        self.assertEqual(response.context['page_obj'].number, 2)
+
+    def test_elided_page_range(self):
+        """Номера страниц: края и окно вокруг текущей, пропуски
+        заменены многоточием."""
+        paginator = CursorPaginator(Post.objects.all(), PER_PAGE, count=300)
+        cases = (
+            (1, [1, 2, 3, 4, ELLIPSIS, 99, 100]),
+            (50, [1, 2, ELLIPSIS, 47, 48, 49, 50, 51, 52, 53,
+                  ELLIPSIS, 99, 100]),
+            (100, [1, 2, ELLIPSIS, 97, 98, 99, 100]),
+        )
+        for number, expected in cases:
+            with self.subTest(number=number):
+                self.assertEqual(
+                    paginator.get_page(number).elided_page_range, expected)
+        self.assertEqual(self.paginator.get_page(1).elided_page_range,
+                         list(self.paginator.page_range))
+
+    def test_navigation_size_does_not_depend_on_page_count(self):
+        """Навигация по тысячам страниц остается короткой."""
+        for count in LARGE_COUNTS:
+            paginator = CursorPaginator(Post.objects.all(), POSTS_PER_PAGE,
+                                        count=count)
+            page = paginator.get_page(paginator.num_pages // 2)
+            html = render_to_string('posts/includes/paginator.html',
+                                    {'page_obj': page})
+            with self.subTest(count=count):
+                self.assertLessEqual(html.count('<li'), 17)
+                self.assertIn(f'page={paginator.num_pages}"', html)
+                self.assertLess(len(html), MAX_NAVIGATION_SIZE)
@@ -0,0 +1,89 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import caching
+from posts.models import Group, Post, User, UserCounters
+
+
+@override_settings(REPLICA_DATABASES=['replica'])
+class ReplicaRoutingTests(TestCase):
+    """Ленты читаются с реплики; кто только что писал, читает default.
+
+    Тестовые базы default и replica - два отдельных SQLite, реплика
+    сама не наполняется, поэтому видно, откуда прочитаны данные.
+    """
+    databases = {'default', 'replica'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='ReplicaAuthor')
+        Post.objects.create(text='Пост в default', author=cls.author)
+        replica_author = User.objects.db_manager('replica').create_user(
+            username='ReplicaAuthor')
+        Post.objects.using('replica').create(
+            text='Пост с реплики', author=replica_author)
+        # Сигналы пишут счетчики в default, реплике они нужны свои.
+        UserCounters.objects.using('replica').create(
+            user=replica_author, posts_count=1)
+
+    def setUp(self):
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def test_feeds_are_read_from_replica(self):
+        """Ленты гостя читаются с реплики."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': 'ReplicaAuthor'}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, 'Пост с реплики')
+                self.assertNotContains(response, 'Пост в default')
+
+    def test_writes_go_to_default(self):
+        """Новый пост записывается в default."""
+        self.author_client.post(reverse('posts:post_create'),
+                                data={'text': 'Новый пост'})
+        self.assertTrue(Post.objects.using('default').filter(
+            text='Новый пост').exists())
+        self.assertFalse(Post.objects.using('replica').filter(
+            text='Новый пост').exists())
+
+    def test_author_reads_own_writes(self):
+        """После записи автор читает ленты из default."""
+        response = self.author_client.post(
+            reverse('posts:post_create'), data={'text': 'Новый пост'})
+        self.assertIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+        response = self.author_client.get(reverse('posts:index'))
+        self.assertContains(response, 'Новый пост')
+
+    def test_fresh_changes_are_cached_briefly(self):
+        """Страница с реплики сразу после изменения кешируется ненадолго:
+        реплика могла еще не получить изменение."""
+        group = Group.objects.using('replica').create(
+            title='Группа', slug='replica-group', description='')
+        scopes = (caching.group_scope(group.pk), caching.GROUPS)
+        hour_ago = time.time_ns() - 3600 * 10 ** 9
+        for scope in scopes:
+            cache.set(caching.VERSION_KEY.format(scope), hour_ago, None)
+        url = reverse('posts:group_list', kwargs={'slug': 'replica-group'})
+        response = self.client.get(url)
+        self.assertEqual(response.context['page_cache_timeout'],
+                         settings.PAGE_CACHE_TIMEOUT)
+        caching.bump(caching.group_scope(group.pk))
+        response = self.client.get(url)
+        self.assertEqual(response.context['page_cache_timeout'],
+                         settings.REPLICA_PIN_SECONDS)
+
+    @override_settings(REPLICA_DATABASES=[])
+    def test_without_replicas_reads_default(self):
+        """Без REPLICA_DATABASES все читается из default."""
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Пост в default')
@@ -0,0 +1,141 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from posts import search
+from posts.models import Group, Post, User
+from posts.views import POSTS_PER_PAGE
+
+SEARCH_URL = reverse('posts:search')
+
+
+class SearchTests(TestCase):
+    """Тестирование полнотекстового поиска постов"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='SearchAuthor')
+        cls.group = Group.objects.create(
+            title='Садоводы', slug='gardeners', description='')
+
+    def setUp(self):
+        cache.clear()
+
+    def found(self, query):
+        posts, count = search.search_posts(query)
+        posts = list(posts.order_by('rank', 'pk'))
+        self.assertEqual(len(posts), count)
+        return posts
+
+    def test_finds_by_word_prefix(self):
+        """Слово запроса находит посты со словами, которые с него
+        начинаются; регистр и буква "ё" не важны."""
+        post = Post.objects.create(
+            text='Сегодня видели Ёжиков в саду', author=self.author)
+        Post.objects.create(text='Про котов', author=self.author)
+        for query in ('ежик', 'ЁЖИКОВ', 'видели ёж'):
+            with self.subTest(query=query):
+                self.assertEqual(self.found(query), [post])
+
+    def test_without_fts5_falls_back_to_like(self):
+        """Без FTS5 в сборке SQLite поиск идет через LIKE."""
+        self.assertTrue(search.is_available())
+        with mock.patch.dict(search._fts5, {'default': False}):
+            post = Post.objects.create(text='ежики в саду',
+                                       author=self.author)
+            posts, count = search.search_posts('ежик')
+            self.assertEqual((list(posts), count), ([post], 1))
+            self.assertNotIn('MATCH', str(posts.query))
+
+    def test_finds_by_group_title(self):
+        """Посты находятся по названию своей группы."""
+        post = Post.objects.create(
+            text='Урожай', author=self.author, group=self.group)
+        self.assertEqual(self.found('садовод'), [post])
+
+    def test_results_are_ranked(self):
+        """Посты, где слова запроса встречаются чаще, идут первыми."""
+        rare = Post.objects.create(
+            text='Кошка и много других слов про жизнь', author=self.author)
+        frequent = Post.objects.create(
+            text='Кошка, кошка, кошка', author=self.author)
+        self.assertEqual(self.found('кошка'), [frequent, rare])
+
+    def test_index_follows_changes(self):
+        """Индекс меняется вместе с постами и группами."""
+        post = Post.objects.create(text='Старый текст', author=self.author)
+        post.text = 'Новый текст'
+        post.group = self.group
+        post.save()
+        self.assertEqual(self.found('старый'), [])
+        self.assertEqual(self.found('новый'), [post])
+        self.group.title = 'Огородники'
+        self.group.save()
+        self.assertEqual(self.found('садоводы'), [])
+        self.assertEqual(self.found('огородники'), [post])
+        post.delete()
+        self.assertEqual(self.found('новый'), [])
+
+    def test_deleted_group_leaves_index(self):
+        """Посты удаленной группы не находятся по ее названию."""
+        group = Group.objects.create(title='Рыбаки', slug='fishers')
+        post = Post.objects.create(
+            text='Улов', author=self.author, group=group)
+        group.delete()
+        self.assertEqual(self.found('рыбаки'), [])
+        self.assertEqual(self.found('улов'), [post])
+
+    def test_match_runs_once(self):
+        """Индекс опрашивается один раз на запрос, а не на каждый
+        найденный пост."""
+        for i in range(3):
+            Post.objects.create(text=f'Общее слово {i}', author=self.author)
+        posts, _ = search.search_posts('общее')
+        self.assertEqual(str(posts.query).count('MATCH'), 1)
+        self.assertEqual(len(posts), 3)
+
+    def test_query_syntax_is_ignored(self):
+        """Спецсимволы FTS5 в запросе не ломают поиск."""
+        post = Post.objects.create(text='Кот AND пес', author=self.author)
+        for query in ('"кот', 'кот AND (', 'NEAR(кот*', '-пес', '***'):
+            with self.subTest(query=query):
+                self.found(query)
+        self.assertEqual(self.found('"кот" пес)'), [post])
+        self.assertEqual(self.found('  '), [])
+
+    def test_rebuild_command(self):
+        """rebuild_search_index собирает индекс по всем постам."""
+        post = Post.objects.create(text='Потерянный пост', author=self.author)
+        search.unindex_post(post.pk)
+        self.assertEqual(self.found('потерянный'), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.found('потерянный'), [post])
+
+    def test_search_page_is_paginated_by_cursor(self):
+        """Страница поиска листается курсором и сохраняет запрос."""
+        for i in range(POSTS_PER_PAGE + 3):
+            Post.objects.create(
+                text='Облако ' * (i + 1), author=self.author)
+        Post.objects.create(text='Дождь', author=self.author)
+        response = self.client.get(SEARCH_URL, {'q': 'облако'})
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.paginator.count, POSTS_PER_PAGE + 3)
+        self.assertContains(
+            response, '?q=%D0%BE%D0%B1%D0%BB%D0%B0%D0%BA%D0%BE&amp;cursor=')
+        second = self.client.get(
+            SEARCH_URL, {'q': 'облако', 'cursor': page_obj.next_cursor})
+        pages = (list(page_obj.object_list)
+                 + list(second.context['page_obj'].object_list))
+        self.assertEqual(pages, self.found('облако'))
+        self.assertIsNone(second.context['page_obj'].next_cursor)
+
+    def test_empty_query(self):
+        """Без запроса страница поиска открывается без результатов."""
+        Post.objects.create(text='Пост', author=self.author)
+        response = self.client.get(SEARCH_URL)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['page_obj']), 0)
@@ -0,0 +1,69 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+
+from posts import thumbnails
+from posts.models import Post, User
+from posts.storage import image_storage
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ContentAddressedStorageTests(TestCase):
+    """Тестирование хранилища картинок по хешу содержимого"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='StorageAuthor')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, name):
+        return Post.objects.create(
+            text='Пост', author=self.user,
+            image=SimpleUploadedFile(name, SMALL_GIF, 'image/gif'))
+
+    def test_name_is_content_hash(self):
+        """Имя файла - sha256 содержимого в каталоге posts/."""
+        digest = hashlib.sha256(SMALL_GIF).hexdigest()
+        post = self.create_post('Small.GIF')
+        self.assertEqual(post.image.name, f'posts/{digest[:2]}/{digest}.gif')
+
+    def test_same_image_is_stored_once(self):
+        """Одинаковая картинка хранится один раз, миниатюры общие."""
+        first = self.create_post('first.gif')
+        second = self.create_post('second.gif')
+        self.assertEqual(first.image.name, second.image.name)
+        directory = os.path.dirname(first.image.path)
+        self.assertEqual(len(os.listdir(directory)), 1)
+        thumbnails.generate(first.image)
+        self.assertIsNotNone(thumbnails.get_cached(second.image, 'card'))
+
+    def test_racing_uploads_share_hash_name(self):
+        """Загрузка, не заметившая готовый файл, не получает суффикс."""
+        first = self.create_post('first.gif')
+        with mock.patch.object(image_storage, 'exists', return_value=False):
+            second = self.create_post('second.gif')
+        self.assertEqual(first.image.name, second.image.name)
+        directory = os.path.dirname(first.image.path)
+        self.assertEqual(os.listdir(directory),
+                         [os.path.basename(first.image.name)])
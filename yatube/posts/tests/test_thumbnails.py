@@ -0,0 +1,180 @@
+import io
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+from PIL import Image
+from sorl.thumbnail import default
+
+from posts import thumbnails
+from posts.models import Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+def make_png(color):
+    # Разное содержимое, чтобы картинки не совпали в хранилище.
+    buffer = io.BytesIO()
+    Image.new('L', (2, 1), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailPipelineTests(TransactionTestCase):
+    """Миниатюры готовятся при публикации, а не при просмотре"""
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='ThumbAuthor')
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def upload(self):
+        return SimpleUploadedFile(
+            name='small.gif', content=SMALL_GIF, content_type='image/gif')
+
+    def test_thumbnail_is_generated_on_create(self):
+        """После публикации поста миниатюра уже готова."""
+        self.client.post(reverse('posts:post_create'),
+                         data={'text': 'Пост', 'image': self.upload()})
+        post = Post.objects.get()
+        thumbnail = thumbnails.get_cached(post.image, 'card')
+        self.assertIsNotNone(thumbnail)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, thumbnail.url)
+        for width in thumbnails.CARD_WIDTHS:
+            with self.subTest(width=width):
+                variant = thumbnails.get_cached(post.image, f'card-{width}')
+                self.assertContains(response, f'{variant.url} {width}w')
+
+    def test_page_does_not_process_images(self):
+        """Без готовой миниатюры страница выводит исходный файл,
+        не обращаясь к Pillow."""
+        post = Post.objects.create(
+            text='Пост', author=self.user, image=self.upload())
+        with mock.patch('sorl.thumbnail.default.engine') as engine:
+            response = self.client.get(
+                reverse('posts:post_detail', kwargs={'post_id': post.pk}))
+        engine.get_image.assert_not_called()
+        self.assertContains(response, post.image.url)
+        self.assertNotContains(response, 'srcset')
+
+    @override_settings(POST_THUMBNAIL_WORKERS=1)
+    def test_thumbnails_are_generated_in_pool(self):
+        """С пулом потоков миниатюры готовятся в фоне."""
+        with mock.patch.object(thumbnails, '_executor', None):
+            thumbnails.start_pool()
+            self.assertIsNotNone(thumbnails._executor)
+            self.client.post(reverse('posts:post_create'),
+                             data={'text': 'Пост', 'image': self.upload()})
+            thumbnails._executor.shutdown(wait=True)
+        post = Post.objects.get()
+        for size in thumbnails.SIZES:
+            with self.subTest(size=size):
+                self.assertIsNotNone(thumbnails.get_cached(post.image, size))
+
+    def test_image_lookup_is_cached(self):
+        """Адрес и srcset картинки читаются из kvstore один раз,
+        а готовые миниатюры сбрасывают запись."""
+        post = Post.objects.create(
+            text='Пост', author=self.user, image=self.upload())
+        thumbnails.get_image(post.image, 'card')
+        with mock.patch.object(default.kvstore, 'get') as get:
+            self.assertEqual(thumbnails.get_image(post.image, 'card'),
+                             (post.image.url, ''))
+        get.assert_not_called()
+        thumbnails.generate(post.image)
+        src, srcset = thumbnails.get_image(post.image, 'card')
+        self.assertEqual(src, thumbnails.get_cached(post.image, 'card').url)
+        self.assertEqual(srcset, thumbnails.get_srcset(post.image, 'card'))
+        self.assertTrue(srcset)
+
+    def test_pending_image_is_cached_briefly(self):
+        """Адрес исходного файла кешируется ненадолго, а неудачная
+        подготовка миниатюр сбрасывает его."""
+        post = Post.objects.create(
+            text='Пост', author=self.user, image=self.upload())
+        with mock.patch.object(thumbnails.cache, 'set') as cache_set:
+            thumbnails.get_image(post.image, 'card')
+        self.assertEqual(cache_set.call_args[0][2],
+                         thumbnails.PENDING_TIMEOUT)
+        thumbnails.get_image(post.image, 'card')
+        with mock.patch.object(thumbnails.backend, 'get_thumbnail',
+                               side_effect=OSError):
+            with self.assertRaises(OSError):
+                thumbnails.generate(post.image)
+        with mock.patch.object(default.kvstore, 'get',
+                               return_value=None) as get:
+            thumbnails.get_image(post.image, 'card')
+        get.assert_called()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class GenerateThumbnailsCommandTests(TestCase):
+    """Тестирование команды generate_thumbnails"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='BackfillAuthor')
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {i}', author=cls.user,
+                image=SimpleUploadedFile(
+                    name=f'backfill{i}.png', content=make_png(i),
+                    content_type='image/png'),
+            )
+            for i in range(2)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def generate(self, **options):
+        out = StringIO()
+        call_command('generate_thumbnails', processes=0, stdout=out,
+                     **options)
+        return out.getvalue()
+
+    def test_generates_missing_thumbnails(self):
+        """Команда готовит миниатюры и пропускает уже готовые."""
+        output = self.generate()
+        self.assertIn('подготовлено 2, пропущено 0', output)
+        for post in self.posts:
+            with self.subTest(post=post.pk):
+                self.assertIsNotNone(
+                    thumbnails.get_cached(post.image, 'card'))
+        self.assertIn('подготовлено 0, пропущено 2', self.generate())
+
+    def test_after_resumes_from_post(self):
+        """--after продолжает обработку со следующего поста."""
+        first, second = self.posts
+        self.generate(after=first.pk)
+        self.assertIsNone(thumbnails.get_cached(first.image, 'card'))
+        self.assertIsNotNone(thumbnails.get_cached(second.image, 'card'))
+
+    def test_force_regenerates_ready_thumbnails(self):
+        """--force заново готовит уже готовые миниатюры."""
+        self.generate()
+        self.assertIn('подготовлено 2, пропущено 0',
+                      self.generate(force=True))
@@ -0,0 +1,112 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.db.models.signals import post_save
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Follow, Post, TimelineEntry, User, UserCounters
+from posts.views import POSTS_PER_PAGE
+
+
+@override_settings(FOLLOW_FEED_MODE='push')
+class PushTimelineTests(TestCase):
+    """Тестирование материализованной ленты подписок"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='TimelineAuthor')
+        cls.follower = User.objects.create_user(username='TimelineFollower')
+
+    def setUp(self):
+        self.follower_client = Client()
+        self.follower_client.force_login(self.follower)
+
+    def get_feed(self):
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        return list(response.context['page_obj'])
+
+    def test_new_post_is_pushed_to_followers(self):
+        """Новый пост автора попадает в ленту подписчика."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.follower, post=post).exists())
+        self.assertEqual(self.get_feed(), [post])
+
+    def test_follow_and_unfollow_change_timeline(self):
+        """Подписка добавляет старые посты автора, отписка - убирает."""
+        post = Post.objects.create(text='Старый пост', author=self.author)
+        Follow.objects.create(user=self.follower, author=self.author)
+        self.assertEqual(self.get_feed(), [post])
+        Follow.objects.filter(user=self.follower, author=self.author).delete()
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.get_feed(), [])
+
+    @override_settings(FOLLOW_FEED_FANOUT_LIMIT=0)
+    def test_popular_author_is_read_on_demand(self):
+        """Посты популярного автора не раскладываются, но видны в ленте."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        post = Post.objects.create(text='Популярный пост', author=self.author)
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.get_feed(), [post])
+
+    def test_rebuild_timeline_command(self):
+        """Команда rebuild_timeline восстанавливает ленты."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        post = Post.objects.create(text='Пост', author=self.author)
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timeline', stdout=StringIO())
+        self.assertEqual(self.get_feed(), [post])
+
+    def test_feed_pages_by_timeline_index(self):
+        """Лента без популярных авторов листается по индексу
+        TimelineEntry без сортировки и совпадает с порядком постов."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        posts = [Post.objects.create(text=f'Пост {i}', author=self.author)
+                 for i in range(POSTS_PER_PAGE + 2)]
+        url = reverse('posts:follow_index')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.follower_client.get(url)
+        sql, = [query['sql'] for query in queries.captured_queries
+                if 'posts_timelineentry' in query['sql']
+                and 'LIMIT' in query['sql']]
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('timeline_feed_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+        page = response.context['page_obj']
+        second = self.follower_client.get(url, {'cursor': page.next_cursor})
+        self.assertEqual(
+            list(page) + list(second.context['page_obj']), posts[::-1])
+
+    def test_popular_author_stays_popular(self):
+        """Посты автора, бывшего популярным, не пропадают из ленты,
+        когда подписчиков снова меньше порога."""
+        with override_settings(FOLLOW_FEED_FANOUT_LIMIT=0):
+            Follow.objects.create(user=self.follower, author=self.author)
+            post = Post.objects.create(text='Пост', author=self.author)
+        self.assertTrue(UserCounters.objects.get(user=self.author).popular)
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.get_feed(), [post])
+        reader = User.objects.create_user(username='TimelineReader')
+        Follow.objects.create(user=reader, author=self.author)
+        self.assertFalse(TimelineEntry.objects.filter(user=reader).exists())
+        reader_client = Client()
+        reader_client.force_login(reader)
+        response = reader_client.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']), [post])
+
+    def test_raw_save_is_not_fanned_out(self):
+        """Загрузка фикстур (raw) не раскладывает посты по лентам."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        now = timezone.now()
+        post = Post(text='Из фикстуры', author=self.author,
+                    pub_date=now, updated=now)
+        post.save_base(raw=True)
+        post_save.send(sender=Post, instance=post, created=True, raw=True)
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
@@ -0,0 +1,91 @@
+import io
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from posts.models import Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+def make_image(size, image_format, exif=None):
+    buffer = io.BytesIO()
+    options = {'exif': exif.tobytes()} if exif else {}
+    Image.new('RGB', size, 'red').save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageUploadTests(TestCase):
+    """Тестирование приема картинок постов"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='UploadAuthor')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def create_post(self, name, content, content_type):
+        return self.client.post(reverse('posts:post_create'), data={
+            'text': 'Пост с картинкой',
+            'image': SimpleUploadedFile(name, content, content_type),
+        })
+
+    @override_settings(POST_IMAGE_MAX_UPLOAD_SIZE=10)
+    def test_too_large_file_is_rejected(self):
+        """Файл больше лимита отклоняется с понятной ошибкой."""
+        response = self.create_post('small.gif', SMALL_GIF, 'image/gif')
+        self.assertFormError(
+            response, 'form', 'image',
+            'Файл слишком большой: не больше 0 МБ.')
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=1)
+    def test_too_many_pixels_are_rejected_by_header(self):
+        """Картинка с большими размерами отклоняется по заголовку."""
+        response = self.create_post('small.gif', SMALL_GIF, 'image/gif')
+        self.assertFormError(
+            response, 'form', 'image',
+            'Картинка слишком большая: не больше 0 мегапикселей.')
+        self.assertFalse(Post.objects.exists())
+
+    def test_exif_is_stripped(self):
+        """EXIF удаляется, поворот из него применяется к картинке."""
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera'
+        exif[0x0112] = 6
+        self.create_post(
+            'photo.jpg', make_image((30, 20), 'JPEG', exif), 'image/jpeg')
+        with Image.open(Post.objects.get().image) as image:
+            self.assertNotIn('exif', image.info)
+            self.assertEqual(image.size, (20, 30))
+
+    @override_settings(POST_IMAGE_MAX_SIDE=100)
+    def test_large_image_is_downscaled(self):
+        """Картинка больше POST_IMAGE_MAX_SIDE уменьшается при загрузке."""
+        self.create_post(
+            'large.png', make_image((300, 200), 'PNG'), 'image/png')
+        with Image.open(Post.objects.get().image) as image:
+            self.assertEqual(image.format, 'PNG')
+            self.assertEqual(image.size, (100, 67))
@@ -0,0 +1,192 @@
+"""Миниатюры изображений постов.
+
+Миниатюры стандартных размеров (SIZES) готовит пул фоновых потоков
+после сохранения поста с новой картинкой. Шаблоны берут из kvstore
+sorl только уже готовую миниатюру и, пока ее нет, выводят исходный
+файл, поэтому обработка изображений не попадает в запрос. Пул на
+POST_THUMBNAIL_WORKERS потоков запускает start_pool из yatube.wsgi;
+без него (тесты, команды, shell или POST_THUMBNAIL_WORKERS = 0)
+миниатюры готовятся сразу после фиксации транзакции в том же потоке.
+
+Адрес картинки и srcset для шаблона собираются из нескольких записей
+kvstore, поэтому результат кешируется на картинку целиком. Пока
+миниатюр нет, запись живет PENDING_TIMEOUT секунд; generate сбрасывает
+ее, даже если подготовить миниатюры не удалось.
+"""
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from PIL import features
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend as BaseThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+
+from . import caching
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+# Варианты картинки поста по ширине для srcset. WebP, если Pillow
+# собран с его поддержкой, иначе JPEG; исходный 'card' остается JPEG
+# для браузеров без srcset.
+CARD_WIDTHS = (320, 480, 640, 960)
+CARD_RATIO = 339 / 960
+VARIANT_FORMAT = 'WEBP' if features.check('webp') else 'JPEG'
+VARIANT_QUALITY = 80
+
+# Размеры, которые выводят шаблоны: имя -> (геометрия, параметры sorl).
+SIZES = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+    **{
+        f'card-{width}': (
+            f'{width}x{round(width * CARD_RATIO)}',
+            {'crop': 'center', 'upscale': True,
+             'format': VARIANT_FORMAT, 'quality': VARIANT_QUALITY},
+        )
+        for width in CARD_WIDTHS
+    },
+}
+# Варианты, из которых собирается srcset размера.
+SRCSET = {
+    'card': [(f'card-{width}', width) for width in CARD_WIDTHS],
+}
+
+IMAGE_KEY = 'posts:image:{}:{}'
+# Сколько секунд кешируется адрес исходного файла, пока миниатюр нет.
+PENDING_TIMEOUT = 10
+
+
+class ThumbnailBackend(BaseThumbnailBackend):
+    def get_options(self, source, options):
+        '''Параметры, дополненные так же, как в get_thumbnail.'''
+        options = dict(options)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        return options
+
+    def get_cached_thumbnail(self, file_, geometry_string, **options):
+        '''Готовая миниатюра из kvstore или None.
+
+        Имя миниатюры совпадает с тем, что дает get_thumbnail;
+        само изображение не читается.
+        '''
+        source = ImageFile(file_)
+        options = self.get_options(source, options)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return default.kvstore.get(ImageFile(name, default.storage))
+
+
+backend = ThumbnailBackend()
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def start_pool():
+    '''Запустить пул потоков, готовящих миниатюры в фоне.'''
+    global _executor
+    with _executor_lock:
+        if _executor is None and settings.POST_THUMBNAIL_WORKERS:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.POST_THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+
+
+def get_cached(image, size):
+    '''Готовая миниатюра размера size или None.'''
+    geometry, options = SIZES[size]
+    return backend.get_cached_thumbnail(image, geometry, **options)
+
+
+def get_srcset(image, size):
+    '''srcset из готовых вариантов размера size.'''
+    candidates = []
+    for variant, width in SRCSET.get(size, ()):
+        thumbnail = get_cached(image, variant)
+        if thumbnail is not None:
+            candidates.append(f'{thumbnail.url} {width}w')
+    return ', '.join(candidates)
+
+
+def _image_key(image, size):
+    name = hashlib.md5(image.name.encode()).hexdigest()
+    return IMAGE_KEY.format(size, name)
+
+
+def get_image(image, size):
+    '''Адрес и srcset картинки размера size одним чтением кеша.'''
+    key = _image_key(image, size)
+    entry = cache.get(key)
+    if entry is None:
+        thumbnail = get_cached(image, size)
+        entry = (
+            image.url if thumbnail is None else thumbnail.url,
+            get_srcset(image, size),
+        )
+        cache.set(key, entry, PENDING_TIMEOUT if thumbnail is None
+                  else settings.PAGE_CACHE_TIMEOUT)
+    return entry
+
+
+def generate(image):
+    '''Подготовить миниатюры всех стандартных размеров.'''
+    try:
+        for geometry, options in SIZES.values():
+            backend.get_thumbnail(image, geometry, **options)
+    finally:
+        cache.delete_many([_image_key(image, size) for size in SIZES])
+
+
+def _generate_for_post(post_id):
+    try:
+        post = Post.objects.filter(pk=post_id).first()
+        if post is None or not post.image:
+            return
+        generate(post.image)
+        # Страницы с исходным файлом вместо миниатюры пересобираются.
+        caching.bump(
+            caching.INDEX,
+            caching.group_scope(post.group_id),
+            caching.profile_scope(post.author_id),
+            caching.post_scope(post.pk),
+        )
+    except Exception:
+        logger.exception('Не удалось подготовить миниатюры поста %s',
+                         post_id)
+
+
+def _generate_in_pool(post_id):
+    try:
+        _generate_for_post(post_id)
+    finally:
+        # Соединения потока пула иначе остались бы открытыми.
+        connections.close_all()
+
+
+def pregenerate(post):
+    '''Поставить в очередь подготовку миниатюр поста.'''
+    if not post.image:
+        return
+    post_id = post.pk
+
+    def submit():
+        if _executor is None:
+            _generate_for_post(post_id)
+        else:
+            _executor.submit(_generate_in_pool, post_id)
+
+    transaction.on_commit(submit)
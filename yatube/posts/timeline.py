@@ -0,0 +1,115 @@
+"""Лента подписок.
+
+В режиме ``pull`` лента собирается запросом по подпискам при каждом
+просмотре. В режиме ``push`` новый пост сразу раскладывается в таблицу
+TimelineEntry всех подписчиков автора вместе с датой публикации, и
+лента листается по индексу (user, -pub_date, -post) этой таблицы без
+сортировки. Авторы, у которых подписчиков стало больше
+FOLLOW_FEED_FANOUT_LIMIT, помечаются популярными (UserCounters.popular)
+навсегда: их посты не раскладываются, а подмешиваются при чтении.
+Режим выбирается настройкой FOLLOW_FEED_MODE.
+"""
+from django.conf import settings
+from django.db.models import F, Q
+
+from .models import Follow, Post, TimelineEntry, UserCounters
+
+PULL = 'pull'
+PUSH = 'push'
+
+
+def is_push_mode():
+    return settings.FOLLOW_FEED_MODE == PUSH
+
+
+# Порядок ленты из TimelineEntry: совпадает с индексом timeline_feed_idx.
+TIMELINE_ORDERING = ('-timeline_date', '-timeline_post')
+FEED_ORDERING = ('-pub_date', '-pk')
+
+
+def follow_feed(user):
+    '''Посты авторов из подписок пользователя и их порядок.'''
+    posts = Post.objects.for_feed()
+    if not is_push_mode():
+        return posts.filter(author__following__user=user), FEED_ORDERING
+    popular = list(_popular_authors(user).values_list('user', flat=True))
+    if not popular:
+        # timeline_post равен pk поста, но сортировка по нему, а не
+        # по posts_post.id, идет по тому же индексу.
+        return posts.filter(timeline_entries__user=user).annotate(
+            timeline_date=F('timeline_entries__pub_date'),
+            timeline_post=F('timeline_entries__post'),
+        ), TIMELINE_ORDERING
+    # Посты популярных авторов есть только в posts_post, поэтому
+    # ленту с ними приходится сливать сортировкой.
+    pushed = TimelineEntry.objects.filter(user=user).values('post')
+    return posts.filter(
+        Q(pk__in=pushed) | Q(author__in=popular)
+    ), FEED_ORDERING
+
+
+def _popular_authors(user):
+    '''Авторы из подписок пользователя, чьи посты не раскладываются.'''
+    return UserCounters.objects.filter(
+        user__following__user=user, popular=True)
+
+
+def _is_popular(author_id):
+    return UserCounters.objects.filter(
+        user_id=author_id, popular=True).exists()
+
+
+def mark_popular(author_id):
+    '''Пометить автора популярным, если подписчиков больше порога.'''
+    UserCounters.objects.filter(
+        user_id=author_id,
+        popular=False,
+        followers_count__gt=settings.FOLLOW_FEED_FANOUT_LIMIT,
+    ).update(popular=True)
+
+
+def fan_out_post(post):
+    '''Разложить новый пост в ленты подписчиков автора.'''
+    if _is_popular(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+         for user_id in followers],
+        batch_size=settings.FOLLOW_FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def add_author(user_id, author_id):
+    '''Добавить в ленту последние посты нового автора из подписок.'''
+    if _is_popular(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-pk'
+    ).values_list('pk', 'pub_date')[:settings.FOLLOW_FEED_BACKFILL]
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+         for pk, pub_date in posts],
+        batch_size=settings.FOLLOW_FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def remove_author(user_id, author_id):
+    '''Убрать из ленты посты автора, от которого отписались.'''
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def rebuild():
+    '''Пересобрать все ленты по текущим подпискам.'''
+    TimelineEntry.objects.all().delete()
+    UserCounters.objects.filter(
+        followers_count__gt=settings.FOLLOW_FEED_FANOUT_LIMIT,
+    ).update(popular=True)
+    for user_id, author_id in Follow.objects.values_list('user', 'author'):
+        add_author(user_id, author_id)
@@ -0,0 +1,128 @@
+"""Прием картинок постов с ограниченным расходом памяти.
+
+ImageUploadHandler стоит первым в FILE_UPLOAD_HANDLERS: он считает байты
+каждого файла и по заголовку узнает размеры картинки, не декодируя ее.
+Слишком большой файл или картинка отбрасываются сразу, остаток запроса
+читается вхолостую, а форма получает RejectedUpload с текстом ошибки.
+Данные, прошедшие проверку, следующий обработчик
+(TemporaryFileUploadHandler) по частям пишет во временный файл.
+
+normalize_image вызывается из формы: удаляет EXIF и уменьшает слишком
+большие оригиналы. JPEG декодируется сразу в уменьшенном масштабе
+(Image.draft), поэтому полная картинка не попадает в память.
+"""
+import io
+import os
+
+from django.conf import settings
+from django.core.files.uploadedfile import (InMemoryUploadedFile,
+                                            SimpleUploadedFile)
+from django.core.files.uploadhandler import FileUploadHandler
+from PIL import Image, ImageOps
+
+# Сколько первых байт файла хранить в поисках размеров картинки:
+# у JPEG перед ними может стоять EXIF до 64 КБ.
+HEADER_LIMIT = 256 * 1024
+
+
+def _header_size(data):
+    '''Размеры картинки по началу файла или None, если их еще нет.'''
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            return image.size
+    except Image.DecompressionBombError:
+        # Pillow сам отказывается открывать такие картинки.
+        return settings.POST_IMAGE_MAX_PIXELS + 1, 1
+    except Exception:
+        return None
+
+
+def check_dimensions(width, height):
+    '''Текст ошибки для слишком большой картинки или None.'''
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        return (
+            'Картинка слишком большая: не больше '
+            f'{settings.POST_IMAGE_MAX_PIXELS // 10 ** 6} мегапикселей.'
+        )
+    return None
+
+
+class RejectedUpload(SimpleUploadedFile):
+    '''Пустой файл вместо отброшенной загрузки.'''
+    def __init__(self, name, content_type, error):
+        super().__init__(name, b'', content_type)
+        self.upload_error = error
+
+
+class ImageUploadHandler(FileUploadHandler):
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.header = b''
+        self.error = None
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.error:
+            return None
+        self.received += len(raw_data)
+        if self.received > settings.POST_IMAGE_MAX_UPLOAD_SIZE:
+            self.error = (
+                'Файл слишком большой: не больше '
+                f'{settings.POST_IMAGE_MAX_UPLOAD_SIZE // 2 ** 20} МБ.'
+            )
+            return None
+        if self.header is not None:
+            self.header += raw_data
+            size = _header_size(self.header)
+            if size is not None:
+                self.error = check_dimensions(*size)
+                self.header = None
+            elif len(self.header) >= HEADER_LIMIT:
+                self.header = None
+            if self.error:
+                return None
+        return raw_data
+
+    def file_complete(self, file_size):
+        if self.error:
+            return RejectedUpload(
+                self.file_name, self.content_type, self.error)
+        return None
+
+
+def _needs_processing(image):
+    if getattr(image, 'is_animated', False):
+        return False
+    side = settings.POST_IMAGE_MAX_SIDE
+    return 'exif' in image.info or max(image.size) > side
+
+
+def normalize_image(uploaded):
+    '''Загруженная картинка без EXIF и не больше POST_IMAGE_MAX_SIDE.
+
+    Картинки, которые не нужно менять, возвращаются как есть.
+    '''
+    uploaded.seek(0)
+    with Image.open(uploaded) as image:
+        if not _needs_processing(image):
+            uploaded.seek(0)
+            return uploaded
+        image_format = image.format
+        side = settings.POST_IMAGE_MAX_SIDE
+        image.draft(image.mode, (side, side))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((side, side), Image.LANCZOS)
+        # PNG переносит EXIF из info, JPEG - только если передать его
+        # в save явно.
+        image.info.pop('exif', None)
+        # Результат не больше POST_IMAGE_MAX_SIDE по стороне, поэтому
+        # его можно держать в памяти.
+        buffer = io.BytesIO()
+        save_options = {'quality': 90} if image_format == 'JPEG' else {}
+        image.save(buffer, format=image_format, **save_options)
+    size = buffer.tell()
+    buffer.seek(0)
+    return InMemoryUploadedFile(
+        buffer, None, os.path.basename(uploaded.name),
+        uploaded.content_type, size, None,
+    )
@@ -1,79 +1,164 @@
 from django.shortcuts import get_object_or_404, render, redirect
-from django.core.paginator import Paginator
-from .models import Group, Post, User, Follow
+from .models import COMMENT_PATH_STEP, Comment, Group, Post, User, Follow
 from .forms import PostForm, CommentForm
+from . import caching, counters, feed_counts, following
+from .caching import page_cache_context, stale_while_revalidate
+from .paginators import CursorPaginator, paginate
+from .search import search_posts
+from .thumbnails import pregenerate
+from .timeline import follow_feed
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.cache import cache_page
+from django.db import IntegrityError, transaction
+from django.http import Http404, JsonResponse
+from django.utils.http import urlencode
+
+from core.replicas import read_from_replica
 
 
 POSTS_PER_PAGE = 10  # Number of posts per page
+COMMENTS_PER_PAGE = 20
+COMMENTS_ORDERING = ('-created', '-pk')
+SEARCH_QUERY_MAX_LENGTH = 200
 
 
-@cache_page(20, key_prefix='index_page')
+@read_from_replica
+@stale_while_revalidate(scopes=(caching.INDEX, caching.GROUPS))
 def index(request):
     '''главная страница,
-    кеш 20 сек
+    для гостей кешируется целиком, карточки постов - в шаблоне
     '''
     template = 'posts/index.html'
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = Post.objects.for_feed()
+    page_obj = paginate(request, post_list, POSTS_PER_PAGE,
+                        count=feed_counts.index_count(post_list))
     context = {
         'page_obj': page_obj,
+        **page_cache_context(request, caching.INDEX, caching.GROUPS),
     }
     return render(request, template, context)
 
 
+@read_from_replica
 def group_posts(request, slug):
     '''страница группы'''
     group = get_object_or_404(Group, slug=slug)
     template = 'posts/group_list.html'
-    post_list = Post.objects.filter(group=group)
-    paginator = Paginator(post_list, POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = Post.objects.for_feed().filter(group=group)
+    page_obj = paginate(request, post_list, POSTS_PER_PAGE,
+                        count=feed_counts.group_count(group.pk, post_list))
     context = {
         'group': group,
         'page_obj': page_obj,
+        **page_cache_context(
+            request, caching.group_scope(group.pk), caching.GROUPS
+        ),
     }
     return render(request, template, context)
 
 
+@read_from_replica
 def profile(request, username):
     '''страница автора'''
-    profile = get_object_or_404(User, username=username)
+    profile = get_object_or_404(
+        User.objects.select_related('counters'), username=username
+    )
     template = 'posts/profile.html'
-    post = Post.objects.filter(author=profile)
-    paginator = Paginator(post, POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    following = (request.user.is_authenticated and profile != request.user
-                 and Follow.objects.filter(
-                     user=request.user, author=profile).exists())
+    post = Post.objects.for_feed().filter(author=profile)
+    page_obj = paginate(request, post, POSTS_PER_PAGE,
+                        count=counters.for_user(profile).posts_count)
     context = {
         'profile': profile,
         'page_obj': page_obj,
-        'following': following,
+        'following': following.is_following(request.user, profile.pk),
+        **page_cache_context(
+            request, caching.profile_scope(profile.pk), caching.GROUPS
+        ),
     }
     return render(request, template, context)
 
 
+@read_from_replica
 def post_detail(request, post_id):
     '''страница поста'''
-    post = get_object_or_404(Post, pk=post_id)
-    form = CommentForm()
-    comments = post.comments.all()
+    post = get_object_or_404(
+        Post.objects.select_related('author__counters', 'group'), pk=post_id
+    )
+    form = CommentForm(post=post)
+    # Сразу выводится первая страница веток комментариев, остальные
+    # подгружает post_comments.
+    comments_page = CursorPaginator(
+        thread_roots(post.pk), COMMENTS_PER_PAGE,
+        ordering=COMMENTS_ORDERING, count=post.threads_count,
+    ).get_page(1)
 
     context = {
         'post': post,
+        'author_counters': counters.for_user(post.author),
         'form': form,
-        'comments': comments,
+        'comments_page': comments_page,
+        'comments': comments_for(post.pk).threads(comments_page),
+        'reply_to': request.GET.get('reply_to', ''),
+        **page_cache_context(
+            request, caching.post_scope(post.pk),
+            caching.profile_scope(post.author_id), caching.GROUPS,
+        ),
     }
     template = 'posts/post_detail.html'
     return render(request, template, context)
 
 
+def thread_roots(post_id):
+    '''Корневые комментарии поста: по ним листаются ветки.'''
+    # Для страницы нужны только пути корней, сами комментарии
+    # с авторами приходят вместе с ветками (comments_for).
+    return Comment.objects.filter(post_id=post_id, depth=0).only(
+        'post_id', 'created', 'path')
+
+
+def comments_for(post_id):
+    '''Комментарии поста с авторами одним запросом.'''
+    return Comment.objects.filter(post_id=post_id).select_related(
+        'author').only('post_id', 'text', 'created', 'path', 'depth',
+                       'author__username')
+
+
+@read_from_replica
+def post_comments(request, post_id):
+    '''следующая страница веток комментариев - фрагмент страницы поста'''
+    post = get_object_or_404(Post.objects.only('threads_count'), pk=post_id)
+    comments_page = paginate(
+        request, thread_roots(post.pk), COMMENTS_PER_PAGE,
+        ordering=COMMENTS_ORDERING, count=post.threads_count,
+    )
+    template = 'posts/includes/comments.html'
+    context = {
+        'post': post,
+        'comments_page': comments_page,
+        'comments': comments_for(post.pk).threads(comments_page),
+        **page_cache_context(request, caching.post_scope(post.pk)),
+    }
+    return render(request, template, context)
+
+
+@read_from_replica
+def comment_replies(request, post_id):
+    '''продолжение обрезанной ветки комментариев - фрагмент страницы поста'''
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    # after - path последнего показанного комментария ветки.
+    after = request.GET.get('after', '')
+    if not (after.isascii() and after.isdigit()
+            and len(after) % COMMENT_PATH_STEP == 0):
+        raise Http404('Некорректный комментарий ветки')
+    template = 'posts/includes/comment_replies.html'
+    context = {
+        'post': post,
+        'after': after,
+        'comments': comments_for(post.pk).replies_after(after),
+        **page_cache_context(request, caching.post_scope(post.pk)),
+    }
+    return render(request, template, context)
+
+
 @login_required
 def post_create(request):
     '''Добавить пост'''
@@ -86,6 +171,7 @@ def post_create(request):
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        pregenerate(post)
         return redirect('posts:profile', request.user)
     context = {
         'form': form,
@@ -108,6 +194,8 @@ def post_edit(request, post_id):
     )
     if form.is_valid():
         form.save()
+        if 'image' in form.changed_data:
+            pregenerate(post)
         return redirect(
             'posts:post_detail', post_id
         )
@@ -124,7 +212,7 @@ def post_edit(request, post_id):
 def add_comment(request, post_id):
     '''Добавить комментарий'''
     post = get_object_or_404(Post, pk=post_id)
-    form = CommentForm(request.POST or None)
+    form = CommentForm(request.POST or None, post=post)
     template = 'posts:post_detail'
     if form.is_valid():
         comment = form.save(commit=False)
@@ -135,33 +223,71 @@ def add_comment(request, post_id):
 
 
 @login_required
+@read_from_replica
 def follow_index(request):
     '''Просмотр подписок(лента)'''
-    post_list = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(post_list, POSTS_PER_PAGE)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    post_list, ordering = follow_feed(request.user)
+    page_obj = paginate(
+        request, post_list, POSTS_PER_PAGE, ordering=ordering,
+        count=feed_counts.follow_count(request.user, post_list),
+    )
     template = 'posts/follow.html'
     context = {
         'page_obj': page_obj,
+        **page_cache_context(
+            request, caching.follow_scope(request.user.pk),
+            caching.INDEX, caching.GROUPS,
+        ),
     }
     return render(request, template, context)
 
 
+@read_from_replica
+def search(request):
+    '''поиск по постам, самые релевантные - первыми'''
+    query = request.GET.get('q', '').strip()[:SEARCH_QUERY_MAX_LENGTH]
+    posts, count = search_posts(query)
+    page_obj = paginate(request, posts, POSTS_PER_PAGE,
+                        ordering=('rank', 'pk'), count=count)
+    template = 'posts/search.html'
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'page_query': urlencode({'q': query}) + '&',
+    }
+    return render(request, template, context)
+
+
+def _follow_response(request, username, is_following, redirect_to):
+    '''Ответ на подписку: кнопка для HTMX, JSON или переход.'''
+    if request.headers.get('HX-Request'):
+        context = {'username': username, 'following': is_following}
+        return render(request, 'posts/includes/follow_button.html', context)
+    if 'application/json' in request.headers.get('Accept', ''):
+        return JsonResponse({'username': username,
+                             'following': is_following})
+    return redirect(*redirect_to)
+
+
 @login_required
 def profile_follow(request, username):
     """Подписаться на автора"""
-    author = get_object_or_404(User, username=username)
-    is_folower = Follow.objects.filter(user=request.user, author=author)
-    if request.user != author and not is_folower.exists():
-        Follow.objects.create(user=request.user, author=author)
-    return redirect('posts:profile', username=username)
+    author = get_object_or_404(User.objects.only('pk'), username=username)
+    if request.user != author:
+        try:
+            with transaction.atomic():
+                Follow.objects.create(user=request.user, author=author)
+        except IntegrityError:
+            # Подписка уже есть: повторный клик или параллельный запрос.
+            pass
+    return _follow_response(request, username, request.user != author,
+                            ('posts:profile', username))
 
 
 @login_required
 def profile_unfollow(request, username):
     """Отписаться от автора"""
-    author = get_object_or_404(User, username=username)
-    Follow.objects.filter(user=request.user, author=author).delete()
-
-    return redirect('posts:follow_index')
+    Follow.objects.filter(
+        user=request.user, author__username=username).delete()
+    return _follow_response(request, username, False,
+                            ('posts:follow_index',))
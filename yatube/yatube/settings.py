@@ -1,4 +1,5 @@
 import os
+import sys
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -41,6 +42,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Снаружи SessionMiddleware, чтобы видеть и запись сессии.
+    'core.replicas.ReplicaPinMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -51,11 +54,17 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'yatube.urls'
 
+# В бою шаблоны компилируются один раз на процесс (cached.Loader),
+# при разработке перечитываются с диска при каждом рендеринге.
+TEMPLATE_SOURCE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -64,9 +73,16 @@ TEMPLATES = [
                 'django.contrib.messages.context_processors.messages',
                 'core.context_processors.year.year',
             ],
+            'loaders': TEMPLATE_SOURCE_LOADERS if DEBUG else [
+                ('django.template.loaders.cached.Loader',
+                 TEMPLATE_SOURCE_LOADERS),
+            ],
         },
     },
 ]
+# Скомпилировать все шаблоны при запуске процесса (yatube.wsgi),
+# а не на первых запросах.
+TEMPLATE_PRECOMPILE = not DEBUG
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
@@ -78,8 +94,42 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+        # Соединение живет между запросами, а не открывается заново.
+        'CONN_MAX_AGE': 60,
+        # Выполняются при каждом новом соединении (core.db).
+        'PRAGMAS': {
+            'journal_mode': 'wal',
+            'synchronous': 'normal',
+            'busy_timeout': 5000,
+            'mmap_size': 256 * 2 ** 20,
+            # Отрицательное значение - размер в КБ, а не в страницах.
+            'cache_size': -64 * 1024,
+            'temp_store': 'memory',
+        },
+    },
 }
+# Реплика для чтения лент (core.replicas): путь к ее файлу задает
+# переменная окружения YATUBE_REPLICA_DB. Без нее алиаса replica нет,
+# маршрутизатор не подключается и все читается из default. Тесты
+# (manage.py test) получают пустую реплику в памяти, чтобы проверить
+# маршрутизацию; чтение с нее включают сами тесты.
+REPLICA_DB = os.environ.get('YATUBE_REPLICA_DB')
+TESTING = sys.argv[1:2] == ['test']
+DATABASE_ROUTERS = []
+REPLICA_DATABASES = []
+if REPLICA_DB or TESTING:
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': REPLICA_DB or ':memory:',
+        'CONN_MAX_AGE': 60,
+    }
+    DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+if REPLICA_DB:
+    REPLICA_DATABASES = ['replica']
+# Сколько после записи пользователь читает из default, пока реплика
+# не догонит основную базу.
+REPLICA_PIN_COOKIE = 'pin_primary'
+REPLICA_PIN_SECONDS = 10
 
 
 # Password validation
@@ -123,6 +173,21 @@ STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'),)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Загрузки проверяются по мере приема и пишутся на диск по частям,
+# а не собираются в памяти (posts.uploads).
+FILE_UPLOAD_HANDLERS = [
+    'posts.uploads.ImageUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+POST_IMAGE_MAX_UPLOAD_SIZE = 10 * 2 ** 20
+POST_IMAGE_MAX_PIXELS = 40 * 10 ** 6
+# Картинки больше по длинной стороне уменьшаются при загрузке.
+POST_IMAGE_MAX_SIDE = 2560
+# Файлы, содержимое которых по адресу не меняется: картинки постов
+# с именем по хешу (posts.storage) и миниатюры sorl. В бою такие же
+# заголовки бессрочного кеширования выставляет веб-сервер.
+MEDIA_IMMUTABLE_RE = r'^(posts/[0-9a-f]{2}/[0-9a-f]{64}\.\w+|cache/.+)$'
+
 
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
@@ -132,8 +197,59 @@ EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 
+# Локальный LRU каждого процесса перед общим для всех процессов кешем.
+# Файловый кеш - замена для одной машины; в бою 'shared' указывает
+# на memcached или redis.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'core.cache.TwoTierCache',
+        'OPTIONS': {
+            'SHARED': 'shared',
+            'LOCAL_MAX_ENTRIES': 1000,
+            'LOCAL_TIMEOUT': 5,
+            'SYNC_INTERVAL': 1,
+        },
+    },
+    'shared': {
+        'BACKEND': 'core.cache.LockingFileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+    },
 }
+
+# Тесты пишут в кеш во временном каталоге (core.runner).
+TEST_RUNNER = 'core.runner.DiscoverRunner'
+
+# Лента подписок: 'pull' - собирается запросом при просмотре,
+# 'push' - раскладывается в TimelineEntry при публикации поста.
+FOLLOW_FEED_MODE = 'pull'
+# Посты авторов с большим числом подписчиков не раскладываются
+# по лентам, а подмешиваются при чтении.
+FOLLOW_FEED_FANOUT_LIMIT = 1000
+# Сколько последних постов автора попадает в ленту при подписке.
+FOLLOW_FEED_BACKFILL = 500
+FOLLOW_FEED_BATCH_SIZE = 500
+
+# Срок жизни кешированных фрагментов страниц; фрагменты сбрасываются
+# сигналами при изменении данных (posts.caching).
+PAGE_CACHE_TIMEOUT = 60 * 60 * 6
+# Сколько после истечения срока страница может отдаваться устаревшей,
+# пока один процесс ее пересчитывает, и сколько живет блокировка.
+PAGE_CACHE_STALE_TIMEOUT = 60 * 10
+PAGE_CACHE_LOCK_TIMEOUT = 30
+
+# Потоки, готовящие миниатюры картинок после публикации поста
+# (posts.thumbnails); 0 - готовить сразу, без фонового пула. Пул
+# запускает yatube.wsgi, поэтому в тестах и командах его нет. Задачи,
+# потерянные при перезапуске, доделывает команда generate_thumbnails.
+POST_THUMBNAIL_WORKERS = 2
+
+# С какого числа строк (по статистике ANALYZE, ее обновляет команда
+# analyze_db) админка показывает оценку размера таблицы вместо
+# COUNT(*) (posts.admin).
+ADMIN_ESTIMATED_COUNT_MIN = 10 ** 5
+
+# Число постов в лентах кешируется и поправляется сигналами
+# (posts.feed_counts); срок жизни ограничивает накопленную ошибку.
+FEED_COUNT_TIMEOUT = 60 * 60
+# С какого числа постов общая лента берет оценку по статистике ANALYZE.
+FEED_ESTIMATED_COUNT_MIN = 10 ** 5
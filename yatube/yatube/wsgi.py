@@ -9,8 +9,17 @@ https://docs.djangoproject.com/en/2.2/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
 
 application = get_wsgi_application()
+
+if settings.TEMPLATE_PRECOMPILE:
+    from core.templating import precompile
+    precompile()
+
+if settings.POST_THUMBNAIL_WORKERS:
+    from posts.thumbnails import start_pool
+    start_pool()